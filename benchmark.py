@@ -0,0 +1,519 @@
+"""Benchmarks of the game engines and search algorithms"""
+
+import argparse
+import os
+import random
+import time
+import tracemalloc
+import numpy as np
+from client.gndclient import GOPHER_STR, DODO_STR, RED, BLUE
+from tools.game import GameGopher, GameDodo, Environment, empty_grid, new_dodo
+from tools.bitboard import GameGopherBitboard, GameDodoBitboard
+from tools.mcts import MCTSNode
+from tools.mcts_pool import PoolNode
+from tools.ordering import MoveOrdering
+from tools.parallel import ROOT_PARALLEL, TREE_PARALLEL
+from tools.endgame import live_cells
+from tools.regions import RegionSolver, board_split
+
+# benchmark settings
+SIZES = [6, 7, 8, 9, 10]
+DURATION = 2.0  # seconds per engine and per size
+SEED = 42
+
+# fixed positions for the search benchmarks: (game, size, random plies, depth)
+POSITIONS = [
+    (GOPHER_STR, 6, 8, 7),
+    (GOPHER_STR, 8, 14, 6),
+    (GOPHER_STR, 10, 20, 5),
+    (DODO_STR, 4, 6, 6),
+    (DODO_STR, 5, 10, 5),
+]
+NB_POSITIONS = 4  # positions per line of POSITIONS
+
+BATCH_SIZES = [64, 256, 1024]
+
+# parallel MCTS: Dodo board, workers, games per match and seconds per move
+PARALLEL_SIZE = 4
+WORKERS = max(2, os.cpu_count() or 1)
+NB_GAMES = 10
+MOVE_TIME = 0.25
+
+# MCTS trees: (game, size) and simulations per search
+TREE_POSITIONS = [(DODO_STR, 4), (DODO_STR, 6), (GOPHER_STR, 6)]
+TREE_SIMULATIONS = 5000
+
+# RAVE: boards, simulations per move of the plain MCTS, games per match and
+# equivalence parameters
+RAVE_POSITIONS = [(GOPHER_STR, 6), (DODO_STR, 4)]
+RAVE_SIMULATIONS = 400
+RAVE_GAMES = 20
+RAVE_EQUIVALENCES = [200, 600, 2000]
+
+# Lazy SMP: seconds per position
+SMP_TIME = 2.0
+
+# symmetries: Gopher (size, depth) and plies played from the empty board
+SYMMETRY_POSITIONS = [(6, 13), (7, 12), (8, 11)]
+SYMMETRY_PLIES = [1, 2, 3]
+
+# proof-number search: (game, size, plies before the end of a random game,
+# depth of the alpha beta); a score of +-WIN_SCORE means the alpha beta solved it
+PNS_POSITIONS = [(GOPHER_STR, 6, 12, 16), (DODO_STR, 4, 10, 14)]
+PNS_NODES = 200000
+
+# regions: Gopher (size, playable cells) of the positions, solved by the alpha
+# beta with cache searching until the end of the game, with the regions
+# analysed as in main.py once the board is split
+REGION_POSITIONS = [(8, 30), (10, 34)]
+
+# numbers of children of the UCB selection benchmark
+BRANCHING = [2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def random_nodes(env: Environment, duration: float) -> int:
+    """Play random games from the initial position during duration seconds,
+    return the number of nodes (legals + play + undo) visited"""
+    nodes: int = 0
+    end: float = time.perf_counter() + duration
+    stack: list = []
+    while time.perf_counter() < end:
+        leg = env.legals()
+        while leg:
+            action = random.choice(leg)
+            stack.append(action)
+            env.play(action)
+            nodes += 1
+            leg = env.legals()
+        while stack:
+            env.undo(stack.pop())
+    return nodes
+
+
+def compare_engines(game: str, engines: list[type], new_state):
+    """Print the random-game nodes per second of each engine on each size"""
+    print(f"{'size':>4} {'dict (nodes/s)':>16} {'bitboard (nodes/s)':>20} {'gain':>6}")
+    for size in SIZES:
+        rates: list[float] = []
+        for engine in engines:
+            random.seed(SEED)
+            env = engine(game, new_state(size), RED, size, 0)
+            rates.append(random_nodes(env, DURATION) / DURATION)
+        print(f"{size:>4} {rates[0]:>16.0f} {rates[1]:>20.0f} {rates[1] / rates[0]:>5.1f}x")
+
+
+def bench_gopher_engines():
+    """Nodes per second of GameGopher against GameGopherBitboard"""
+    compare_engines(GOPHER_STR, [GameGopher, GameGopherBitboard], empty_grid)
+
+
+def bench_dodo_engines():
+    """Nodes per second of GameDodo against GameDodoBitboard"""
+    compare_engines(DODO_STR, [GameDodo, GameDodoBitboard], new_dodo)
+
+
+def fixed_positions() -> list[tuple[Environment, int]]:
+    """Return the benchmark positions with their search depth, always the same"""
+    rng = random.Random(SEED)
+    res: list[tuple[Environment, int]] = []
+    for game, size, plies, depth in POSITIONS:
+        for _ in range(NB_POSITIONS):
+            if game == GOPHER_STR:
+                env = GameGopherBitboard(game, empty_grid(size), RED, size, 0)
+            else:
+                env = GameDodoBitboard(game, new_dodo(size), RED, size, 0)
+            for _ in range(plies):
+                if env.final():
+                    break
+                env.play(rng.choice(env.legals()))
+            if not env.final():
+                res.append((env, depth))
+    return res
+
+
+def bench_ordering():
+    """Nodes of the iterative deepening at fixed depth with each move ordering"""
+    configs = {
+        "none": MoveOrdering(False, False, False),
+        "tt": MoveOrdering(True, False, False),
+        "tt+killers": MoveOrdering(True, True, False),
+        "tt+killers+history": MoveOrdering(True, True, True),
+    }
+    total: dict[str, int] = dict.fromkeys(configs, 0)
+    for name, ordering in configs.items():
+        for env, depth in fixed_positions():
+            env.ordering = ordering
+            env.strategy_iterative_deepening(float("inf"), depth)
+            total[name] += env.nodes
+        print(f"{name:>20} : {total[name]:>9} nodes  {ordering.stats()}")
+    for name in configs:
+        print(f"{name:>20} : {total[name] / total['none']:.2f} of the nodes")
+
+
+def bench_pvs():
+    """Nodes of PVS and MTD(f) against alpha beta with cache at fixed depth"""
+    searches = {
+        "alpha_beta_cache": lambda env, depth: env.strategy_alpha_beta_cache(depth),
+        "iterative_deepening": lambda env, depth: env.strategy_iterative_deepening(
+            float("inf"), depth
+        ),
+        "pvs": lambda env, depth: env.strategy_pvs(float("inf"), depth),
+        "mtdf": lambda env, depth: env.strategy_mtdf(float("inf"), depth),
+    }
+    total: dict[str, int] = dict.fromkeys(searches, 0)
+    for name, search in searches.items():
+        start: float = time.perf_counter()
+        for env, depth in fixed_positions():
+            search(env, depth)
+            total[name] += env.nodes
+        elapsed: float = time.perf_counter() - start
+        print(
+            f"{name:>20} : {total[name]:>9} nodes "
+            f"({total[name] / total['alpha_beta_cache']:.2f}) in {elapsed:.2f}s"
+        )
+
+
+def bench_batch():
+    """Playouts per second, one at a time against batched with NumPy"""
+    print(f"{'game':>6} {'size':>4} {'serial':>8}", end="")
+    print("".join(f" {'batch ' + str(nb):>11}" for nb in BATCH_SIZES))
+    for game, engine, new_state in (
+        (GOPHER_STR, GameGopherBitboard, empty_grid),
+        (DODO_STR, GameDodoBitboard, new_dodo),
+    ):
+        for size in SIZES:
+            random.seed(SEED)
+            env = engine(game, new_state(size), RED, size, 0)
+            nb: int = 0
+            start: float = time.perf_counter()
+            while time.perf_counter() < start + DURATION:
+                env.random_playout()
+                nb += 1
+            print(f"{game:>6} {size:>4} {nb / DURATION:>8.0f}", end="")
+            for batch_size in BATCH_SIZES:
+                nb = 0
+                start = time.perf_counter()
+                while time.perf_counter() < start + DURATION:
+                    env.batch_playouts(batch_size)
+                    nb += batch_size
+                print(f" {nb / (time.perf_counter() - start):>11.0f}", end="")
+            print()
+
+
+def simulations_per_second(env: Environment, workers: int, parallel: str) -> float:
+    """Simulations per second of a parallel MCTS from the position, all the
+    trees included"""
+    env.strategy_mcts(200, None, workers=workers, parallel=parallel)  # warm up
+    start: float = time.perf_counter()
+    _, child = env.strategy_mcts(200 * workers, None, workers=workers, parallel=parallel)
+    return child.parent.n() / (time.perf_counter() - start)
+
+
+def match(game: str, size: int, first, second, nb_games: int) -> int:
+    """Play games between two strategies (functions of the environment which
+    return an action), colors swapped every game. Return the wins of the
+    first one."""
+    wins: int = 0
+    for i in range(nb_games):
+        players = {RED: first, BLUE: second} if i % 2 == 0 else {RED: second, BLUE: first}
+        if game == GOPHER_STR:
+            env = GameGopherBitboard(game, empty_grid(size), RED, size, 0)
+        else:
+            env = GameDodoBitboard(game, new_dodo(size), RED, size, 0)
+        while not env.final():
+            env.play(players[env.player](env))
+        if players[env.winner()] is first:
+            wins += 1
+    return wins
+
+
+def mcts_match(modes: dict, nb_games: int) -> int:
+    """Play games between two MCTS, each one given the number of simulations
+    it runs in MOVE_TIME. Return the wins of the first one."""
+
+    def strategy(workers: int, parallel: str, rate: float):
+        """MCTS running the simulations of MOVE_TIME"""
+        nb_simu: int = int(rate * MOVE_TIME)
+        if parallel == ROOT_PARALLEL:
+            nb_simu //= workers  # simulations of each tree
+        return lambda env: env.strategy_mcts(
+            nb_simu, None, workers=workers, parallel=parallel
+        )[0]
+
+    first, second = (strategy(*mode) for mode in modes.values())
+    return match(DODO_STR, PARALLEL_SIZE, first, second, nb_games)
+
+
+def bench_parallel():
+    """Speedup of the root and tree parallel MCTS against the serial search,
+    and their strength against it at equal time per move"""
+    random.seed(SEED)
+    env = GameDodoBitboard(DODO_STR, new_dodo(PARALLEL_SIZE), RED, PARALLEL_SIZE, 0)
+    modes: dict[str, tuple[int, str, float]] = {}
+    for name, workers, parallel in (
+        ("serial", 1, ROOT_PARALLEL),
+        ("root", WORKERS, ROOT_PARALLEL),
+        ("tree", WORKERS, TREE_PARALLEL),
+    ):
+        modes[name] = (workers, parallel, simulations_per_second(env, workers, parallel))
+    serial: float = modes["serial"][2]
+    print(f"{os.cpu_count()} cores, {WORKERS} workers")
+    for name, (_, _, rate) in modes.items():
+        print(f"{name:>8} : {rate:>8.0f} simulations/s  speedup {rate / serial:.2f}")
+    for first, second in (("root", "serial"), ("tree", "serial"), ("tree", "root")):
+        pair = {first: modes[first], second: modes[second]}
+        wins: int = mcts_match(pair, NB_GAMES)
+        print(f"{first:>8} against {second:<8}: {wins}/{NB_GAMES} wins")
+
+
+def tree_memory(env: Environment, search) -> tuple[int, int, float]:
+    """Run a search, return the nodes of its tree, the memory they use and
+    the duration of the search"""
+    tracemalloc.start()
+    start: float = time.perf_counter()
+    _, child = search(env)
+    elapsed: float = time.perf_counter() - start
+    memory: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes: int = 0
+    stack = [child.parent]
+    while stack:
+        nodes += 1
+        stack.extend(stack.pop().children)
+    if isinstance(child, PoolNode):
+        memory = nodes * child.pool.bytes_per_node()  # the rest of the pool is free
+    return nodes, memory, elapsed
+
+
+def bench_mcts_memory():
+    """Bytes per node of the MCTSNode trees against the node pool"""
+    searches = {
+        "MCTSNode": lambda env: env.strategy_mcts(TREE_SIMULATIONS),
+        "NodePool": lambda env: env.strategy_mcts_pool(
+            TREE_SIMULATIONS, capacity=TREE_SIMULATIONS * 64
+        ),
+    }
+    print(f"{'game':>6} {'size':>4} {'tree':>9} {'nodes':>7} {'bytes/node':>10} {'time':>6}")
+    for game, size in TREE_POSITIONS:
+        for name, search in searches.items():
+            random.seed(SEED)
+            if game == GOPHER_STR:
+                env = GameGopherBitboard(game, empty_grid(size), RED, size, 0)
+            else:
+                env = GameDodoBitboard(game, new_dodo(size), RED, size, 0)
+            nodes, memory, elapsed = tree_memory(env, search)
+            print(
+                f"{game:>6} {size:>4} {name:>9} {nodes:>7} "
+                f"{memory / nodes:>10.0f} {elapsed:>5.2f}s"
+            )
+
+
+def best_child_list(node: MCTSNode, c_param=np.sqrt(2)) -> MCTSNode:
+    """Former MCTSNode.best_child: one list of NumPy scalar operations"""
+    choices_weights = [
+        (c.q() / c.n()) + c_param * np.sqrt((np.log(node.n()) / c.n()))
+        for c in node.children
+    ]
+    return node.children[np.argmax(choices_weights)]
+
+
+def bench_selection():
+    """Cost of the UCB selection of a child against the number of children"""
+    rng = random.Random(SEED)
+    print(f"{'children':>8} {'list (us)':>10} {'arrays (us)':>12} {'gain':>6}")
+    for nb in BRANCHING:
+        node = MCTSNode(list(range(nb)), RED)
+        for action in range(nb):
+            node._untried_actions.remove(action)
+            child = MCTSNode([], RED, node, action)
+            child._slot = len(node.children)
+            node.children.append(child)
+            visits: int = rng.randint(1, 100)
+            wins: int = rng.randint(0, visits)
+            child.add_results(visits, wins, visits - wins)
+            node.add_results(visits, 0, 0)
+        assert best_child_list(node) is node.best_child()
+        times: list[float] = []
+        for select in (best_child_list, MCTSNode.best_child):
+            nb_calls: int = 0
+            start: float = time.perf_counter()
+            while time.perf_counter() < start + DURATION / 4:
+                for _ in range(100):
+                    select(node)
+                nb_calls += 100
+            times.append((time.perf_counter() - start) / nb_calls * 1e6)
+        print(f"{nb:>8} {times[0]:>10.2f} {times[1]:>12.2f} {times[0] / times[1]:>5.1f}x")
+
+
+def bench_rave():
+    """Wins of MCTS with RAVE against plain MCTS, with the same number of
+    simulations and with 4 times less"""
+    random.seed(SEED)
+
+    def mcts(nb_simu: int, rave: float):
+        """MCTS strategy with a fixed number of simulations"""
+        return lambda env: env.strategy_mcts(nb_simu, rave=rave)[0]
+
+    plain = mcts(RAVE_SIMULATIONS, 0)
+    for game, size in RAVE_POSITIONS:
+        for k in RAVE_EQUIVALENCES:
+            for nb_simu in (RAVE_SIMULATIONS, RAVE_SIMULATIONS // 4):
+                wins: int = match(game, size, mcts(nb_simu, k), plain, RAVE_GAMES)
+                print(
+                    f"{game:>6} {size:>2} : RAVE k={k:<5} {nb_simu:>4} simulations "
+                    f"against {RAVE_SIMULATIONS} : {wins}/{RAVE_GAMES} wins"
+                )
+
+
+def bench_lazy_smp():
+    """Depth reached by the serial iterative deepening and by Lazy SMP on
+    WORKERS processes in the same time"""
+    print(f"{os.cpu_count()} cores, {WORKERS} workers, {SMP_TIME}s per position")
+    depths: dict[str, int] = {"serial": 0, "lazy_smp": 0}
+    for env, _ in fixed_positions():
+        if env.game != GOPHER_STR:
+            continue
+        state, player = dict(env.state), env.player
+        serial = GameGopherBitboard(env.game, dict(state), player, env.hex_size, 0)
+        serial.strategy_iterative_deepening(SMP_TIME)
+        smp = GameGopherBitboard(env.game, dict(state), player, env.hex_size, 0)
+        smp.strategy_lazy_smp(SMP_TIME, workers=WORKERS)
+        print(
+            f"size {env.hex_size:>2} : serial depth {serial.depth_reached:>2}, "
+            f"lazy smp depth {smp.depth_reached:>2}"
+        )
+        depths["serial"] += serial.depth_reached
+        depths["lazy_smp"] += smp.depth_reached
+    print(f"total : {depths}")
+
+
+def bench_symmetry():
+    """Nodes and time of the alpha beta with cache at fixed depth in Gopher
+    openings, with and without the symmetric keys"""
+    rng = random.Random(SEED)
+    total: dict[bool, list[float]] = {False: [0, 0.0], True: [0, 0.0]}
+    for size, depth in SYMMETRY_POSITIONS:
+        for plies in SYMMETRY_PLIES:
+            env = GameGopherBitboard(GOPHER_STR, empty_grid(size), RED, size, 0)
+            for _ in range(plies):
+                env.play(rng.choice(env.legals()))
+            line: str = f"size {size:>2}, {plies} plies, depth {depth:>2} :"
+            for use_symmetries in (False, True):
+                search = GameGopherBitboard(
+                    GOPHER_STR, env.state, env.player, size, 0
+                )
+                search.use_symmetries = use_symmetries
+                start: float = time.perf_counter()
+                search.strategy_alpha_beta_cache(depth)
+                elapsed: float = time.perf_counter() - start
+                total[use_symmetries][0] += search.nodes
+                total[use_symmetries][1] += elapsed
+                name: str = "symmetric" if use_symmetries else "plain"
+                line += f" {name} {search.nodes:>7} nodes {elapsed:5.2f}s"
+            print(line)
+    for use_symmetries, (nodes, elapsed) in total.items():
+        name = "symmetric" if use_symmetries else "plain"
+        print(f"{name:>9} : {nodes:>8} nodes in {elapsed:.2f}s")
+
+
+def forced_endings(game: str, size: int, plies: int) -> list[Environment]:
+    """Positions a few plies before the end of random games"""
+    rng = random.Random(SEED)
+    res: list[Environment] = []
+    for _ in range(NB_POSITIONS):
+        if game == GOPHER_STR:
+            env = GameGopherBitboard(game, empty_grid(size), RED, size, 0)
+        else:
+            env = GameDodoBitboard(game, new_dodo(size), RED, size, 0)
+        history: list = []
+        while not env.final():
+            history.append(rng.choice(env.legals()))
+            env.play(history[-1])
+        for action in reversed(history[-plies:]):
+            env.undo(action)
+        res.append(type(env)(game, env.state, env.player, size, 0))
+    return res
+
+
+def bench_pns():
+    """Proof-number search against the alpha beta with cache at a fixed depth
+    on positions close to the end of the games"""
+    for game, size, plies, depth in PNS_POSITIONS:
+        total: dict[str, list[float]] = {"pns": [0, 0.0], "alpha_beta": [0, 0.0]}
+        for env in forced_endings(game, size, plies):
+            start: float = time.perf_counter()
+            env.strategy_pns(PNS_NODES)
+            pns_time: float = time.perf_counter() - start
+            proof: str = {True: "win", False: "loss", None: "unknown"}[env.proven_win]
+            line: str = (
+                f"{game:>6} {size:>2} : pns {proof:>7} {env.nodes:>7} nodes "
+                f"{pns_time:6.2f}s ({env.nodes_per_second:.0f}/s), "
+                f"proof {env.proof_size:>5}"
+            )
+            total["pns"][0] += env.nodes
+            total["pns"][1] += pns_time
+
+            start = time.perf_counter()
+            env.strategy_alpha_beta_cache(depth)
+            elapsed: float = time.perf_counter() - start
+            entry = env.cache.probe(env.canonical_key()[0])
+            score = entry[2] if entry is not None else None
+            print(f"{line} | alpha beta {env.nodes:>8} nodes {elapsed:6.2f}s ({score})")
+            total["alpha_beta"][0] += env.nodes
+            total["alpha_beta"][1] += elapsed
+        for name, (nodes, elapsed) in total.items():
+            print(f"{game:>6} {size:>2} : {name:>10} {nodes:>8} nodes in {elapsed:.2f}s")
+
+
+def bench_regions():
+    """Nodes and time of the alpha beta with cache solving late Gopher
+    positions, with and without the region analysis"""
+    rng = random.Random(SEED)
+    for size, cells in REGION_POSITIONS:
+        total: dict[bool, list[float]] = {False: [0, 0.0], True: [0, 0.0]}
+        for _ in range(NB_POSITIONS):
+            env = GameGopherBitboard(GOPHER_STR, empty_grid(size), RED, size, 0)
+            while not env.final() and live_cells(env) > cells:
+                env.play(rng.choice(env.legals()))
+            line: str = f"size {size:>2}, {live_cells(env):>2} cells :"
+            for use_regions in (False, True):
+                search = GameGopherBitboard(GOPHER_STR, env.state, env.player, size, 0)
+                if use_regions and board_split(search):
+                    search.regions = RegionSolver(size)
+                start: float = time.perf_counter()
+                search.strategy_alpha_beta_cache(cells)
+                elapsed: float = time.perf_counter() - start
+                total[use_regions][0] += search.nodes
+                total[use_regions][1] += elapsed
+                name: str = "regions" if use_regions else "plain"
+                line += f" {name} {search.nodes:>7} nodes {elapsed:5.2f}s"
+            print(line)
+        for use_regions, (nodes, elapsed) in total.items():
+            name = "regions" if use_regions else "plain"
+            print(f"size {size:>2} {name:>7} : {nodes:>8} nodes in {elapsed:.2f}s")
+
+
+BENCHMARKS = {
+    "gopher_engines": bench_gopher_engines,
+    "dodo_engines": bench_dodo_engines,
+    "ordering": bench_ordering,
+    "pvs": bench_pvs,
+    "batch": bench_batch,
+    "parallel": bench_parallel,
+    "mcts_memory": bench_mcts_memory,
+    "selection": bench_selection,
+    "rave": bench_rave,
+    "lazy_smp": bench_lazy_smp,
+    "symmetry": bench_symmetry,
+    "pns": bench_pns,
+    "regions": bench_regions,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="Benchmark", description="Benchmarks of the engines and searches"
+    )
+    parser.add_argument("benchmark", choices=list(BENCHMARKS))
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark]()
@@ -0,0 +1,90 @@
+"""Offline builder of the opening books read by main.py (tools/book.py)"""
+
+import argparse
+import time
+from client.gndclient import GOPHER_STR, DODO_STR, RED, Action, Score
+from tools.book import book_key, book_path, write_book
+from tools.bitboard import GameGopherBitboard, GameDodoBitboard
+from tools.game import Environment, empty_grid, map_action, new_dodo
+from tools.hexagons import board_symmetries
+
+# default settings: plies of the book and seconds of search per position
+BOOK_PLIES = {GOPHER_STR: 6, DODO_STR: 2}
+SEARCH_TIME = 10.0
+
+GOPHER_MAX_DEPTH = 64
+DODO_MAX_SIMU = 10**7  # the search is bounded by its time budget
+
+
+def new_env(game: str, hex_size: int) -> Environment:
+    """Environment on the initial position of a game, RED to play"""
+    if game == GOPHER_STR:
+        return GameGopherBitboard(game, empty_grid(hex_size), RED, hex_size, 0)
+    return GameDodoBitboard(game, new_dodo(hex_size), RED, hex_size, 0)
+
+
+def book_positions(game: str, hex_size: int, plies: int) -> list[Environment]:
+    """Positions of the first plies, one per class of positions equivalent by a
+    symmetry, without the ones with a single legal move"""
+    res: list[Environment] = []
+    seen: set[int] = set()
+    layer: list[Environment] = [new_env(game, hex_size)]
+    for _ in range(plies):
+        next_layer: list[Environment] = []
+        for env in layer:
+            leg: list[Action] = env.legals()
+            if len(leg) > 1:
+                res.append(env)
+            for action in leg:
+                env.play(action)
+                key, _ = book_key(game, env.state, env.player, hex_size)
+                if key not in seen and not env.final():
+                    seen.add(key)
+                    next_layer.append(type(env)(game, env.state, env.player, hex_size, 0))
+                env.undo(action)
+        layer = next_layer
+    return res
+
+
+def search(env: Environment, time_budget: float) -> tuple[Action, Score]:
+    """Search a position, return the move and its score for the player to move"""
+    if env.game == DODO_STR:
+        action, child = env.strategy_mcts(DODO_MAX_SIMU, time_budget=time_budget)
+        return action, round(100 * child.q() / max(child.n(), 1))
+
+    action = env.strategy_iterative_deepening(time_budget, GOPHER_MAX_DEPTH)
+    key, _ = env.canonical_key()
+    entry = env.cache.probe(key)
+    score: Score = entry[2] if entry is not None else 0
+    return action, score if env.player == RED else -score
+
+
+def build(game: str, hex_size: int, plies: int, time_budget: float):
+    """Search the positions of the first plies and write the book"""
+    tables = board_symmetries(hex_size)
+    entries: dict[int, tuple[Action, Score]] = {}
+    positions: list[Environment] = book_positions(game, hex_size, plies)
+    print(f"{game} {hex_size} : {len(positions)} positions of {plies} plies")
+    start: float = time.perf_counter()
+    for i, env in enumerate(positions):
+        key, symmetry = book_key(game, env.state, env.player, hex_size)
+        action, score = search(env, time_budget)
+        entries[key] = (map_action(action, tables[symmetry]), score)
+        print(f"{i + 1}/{len(positions)} : {action} ({score})")
+    path: str = book_path(game, hex_size)
+    write_book(path, hex_size, entries)
+    print(f"{path} : {len(entries)} records in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="BuildBook", description="Build the opening book of a board size"
+    )
+    parser.add_argument("game", choices=[GOPHER_STR, DODO_STR])
+    parser.add_argument("sizes", type=int, nargs="+")
+    parser.add_argument("-p", "--plies", type=int)
+    parser.add_argument("-t", "--time", type=float, default=SEARCH_TIME)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        build(args.game, size, args.plies or BOOK_PLIES[args.game], args.time)
@@ -0,0 +1,28 @@
+"""Offline builder of the Gopher endgame tables read by main.py (tools/endgame.py)"""
+
+import argparse
+import time
+from tools.endgame import TABLE_SIZES, solve_board, table_path
+
+
+def build(hex_size: int):
+    """Solve every position of a board and write its table"""
+    start: float = time.perf_counter()
+    table = solve_board(hex_size)
+    path: str = table_path(hex_size)
+    table.save(path)
+    print(
+        f"{path} : {len(table)} positions, {table.nbytes()} bytes "
+        f"in {time.perf_counter() - start:.0f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="BuildEndgame", description="Solve the Gopher boards of small sizes"
+    )
+    parser.add_argument("sizes", type=int, nargs="*", default=list(TABLE_SIZES))
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        build(size)
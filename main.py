@@ -1,6 +1,7 @@
 """Main file to run the client on the server"""
 
 import argparse
+import os
 from client.gndclient import (
     start,
     Cell,
@@ -22,17 +23,44 @@ from tools.game import (
     axial_to_cube,
     DoubledCoord,
     empty_grid,
-    GameDodo,
-    GameGopher,
 )
+from tools.bitboard import GameGopherBitboard, GameDodoBitboard
+from tools.book import load_book
+from tools.endgame import LIVE_CELLS_MAX, live_cells, load_table, solve
+from tools.mcts import prune, reroot
+from tools.pns import PNS_MAX_NODES
+from tools.regions import RegionSolver, board_split
+from tools.ponder import Ponder
 
 # game settings
 DODO_DEPTH = 6
-DODO_NB_SIMU = 5000
+DODO_MAX_SIMU = 200000  # the search is bounded by its time budget
+DODO_WORKERS = os.cpu_count() or 1  # root parallel MCTS, one tree per process
+DODO_MAX_NODES = 300000  # nodes of the tree kept from one move to the next
 
-GOPHER_DEPTH = 8
+GOPHER_MAX_DEPTH = 64
+GOPHER_WORKERS = os.cpu_count() or 1  # Lazy SMP processes, 1 for the serial search
 GOPHER_NB_SIMU = 2500
 
+# search during the time of the opponent
+PONDER = True
+
+# play the moves of the opening books built by build_book.py
+USE_BOOK = True
+
+# proof-number search of the position before the main search, with a share of
+# its time: a proven win is played at once. It only runs once a proof is
+# likely: at most PNS_LIVE_CELLS cells still playable in Gopher, a player with
+# at most PNS_DODO_MOVES moves in Dodo
+PNS_CHECK = True
+PNS_TIME_SHARE = 0.1
+PNS_LIVE_CELLS = 40
+PNS_DODO_MOVES = 4
+
+# time management
+MIN_MOVES_LEFT = 8  # never plan for less moves than that
+MOVE_TIME_MARGIN = 0.5  # seconds kept for the network and the engine overhead
+
 
 # --------------------------------------
 
@@ -55,29 +83,22 @@ def get_action(env: Environment, new_state: State) -> Action:
         for pos, player in new_state:
             if player != EMPTY:
                 hexa = cell_to_cellperso(pos)
-                if env.state[hexa] == EMPTY:
+                if env.cell_owner(hexa) == EMPTY:
                     return hexa
         return None
 
     # Dodo
-    # Find the cell that disappeared in the old state (source)
+    # Find the cell that disappeared in the old state (source) and the one
+    # that appeared in the new state (destination)
     source: CellPerso = None
-    for hexa, player in env.state.items():
-        if player != EMPTY:
-            pos: Cell = cellperso_to_cell(hexa)
-            for cell2, player2 in new_state:
-                if player2 == EMPTY and pos == cell2:
-                    source = hexa
-                    break
-
-    # Find the cell that appeared in the new state (destination)
     destination: CellPerso = None
     for pos, player in new_state:
-        if player != EMPTY:
-            hexa = cell_to_cellperso(pos)
-            if env.state[hexa] == EMPTY:
-                destination = hexa
-                break
+        hexa = cell_to_cellperso(pos)
+        owner: Player = env.cell_owner(hexa)
+        if player == EMPTY and owner != EMPTY:
+            source = hexa
+        elif player != EMPTY and owner == EMPTY:
+            destination = hexa
 
     if source is None or destination is None:
         return None
@@ -85,6 +106,44 @@ def get_action(env: Environment, new_state: State) -> Action:
     return (source, destination)
 
 
+def moves_left(env: Environment) -> int:
+    """Estimation of the number of moves we still have to play"""
+    if env.game == GOPHER_STR:
+        # a game rarely fills the board: about a quarter of the empty cells are ours
+        empty: int = sum(
+            1 for cell in empty_grid(env.hex_size) if env.cell_owner(cell) == EMPTY
+        )
+        return empty // 4
+    # each move of a Dodo pawn brings it one or two rows closer to the opposite
+    # side, where it is blocked: a quarter of the remaining rows of our pawns
+    h: int = env.hex_size - 1
+    rows: int = 0
+    for cell in empty_grid(env.hex_size):
+        player: Player = env.cell_owner(cell)
+        if player == env.player == RED:
+            rows += 2 * h - cell.q - cell.r
+        elif player == env.player == BLUE:
+            rows += 2 * h + cell.q + cell.r
+    return rows // 4
+
+
+def proof_likely(env: Environment) -> bool:
+    """Check if the proof-number search can solve the position in its time"""
+    if env.game == GOPHER_STR:
+        return live_cells(env) <= PNS_LIVE_CELLS
+    moves: int = len(env.legals())
+    env.player = 3 - env.player
+    moves = min(moves, len(env.legals()))
+    env.player = 3 - env.player
+    return moves <= PNS_DODO_MOVES
+
+
+def time_budget(env: Environment, time_left: Time) -> float:
+    """Time to spend on the next move, in seconds"""
+    moves: int = max(MIN_MOVES_LEFT, moves_left(env))
+    return max(0.0, time_left / moves - MOVE_TIME_MARGIN)
+
+
 # --------------------------------------
 
 
@@ -94,28 +153,15 @@ def initialize(
     """Initialize the environment"""
 
     initial_state: StatePerso = empty_grid(hex_size)
+    # synchronize the state of the game with the state given by the server
+    for pos, play in state:
+        initial_state[cell_to_cellperso(pos)] = play
 
     if game == GOPHER_STR:
-        env = GameGopher(game, initial_state, player, hex_size, total_time)
-        # synchronize the state of the game with the state given by the server
-        for pos, play in state:
-            hexa = cell_to_cellperso(pos)
-            env.state[hexa] = play
-            if play == RED:
-                env.red_pawns[hexa] = RED
-            elif play == BLUE:
-                env.blue_pawns[hexa] = BLUE
-
+        env = GameGopherBitboard(game, initial_state, player, hex_size, total_time)
+        env.endgame = load_table(hex_size)
     else:
-        env = GameDodo(game, initial_state, player, hex_size, total_time)
-        # synchronize the state of the game with the state given by the server
-        for pos, play in state:
-            hexa = cell_to_cellperso(pos)
-            env.state[hexa] = play
-            if play == RED:
-                env.red_pawns.append(hexa)
-            elif play == BLUE:
-                env.blue_pawns.append(hexa)
+        env = GameDodoBitboard(game, initial_state, player, hex_size, total_time)
     return env
 
 
@@ -137,10 +183,9 @@ def strategy(
     # update the env with the action of the opponent
     opponent_action: Action = get_action(env, state)
     # if using MCTS, update of the root
+    env.root = reroot(env.root, opponent_action)
     if env.root:
-        for child in env.root.children:
-            if child.parent_action == opponent_action:
-                env.root = child
+        print(f"Tree nodes kept : {prune(env.root, DODO_MAX_NODES)}")
 
     if opponent_action is not None:
         env.play(opponent_action)
@@ -148,11 +193,64 @@ def strategy(
     # print the time remaining for the player
     print(f"Time remaining for player {player} : {time_left}")
 
+    # the positions left are few enough to be solved at once
+    if env.game == GOPHER_STR and (
+        env.endgame is None or env.endgame.probe(env) is None
+    ):
+        if live_cells(env) <= LIVE_CELLS_MAX:
+            env.endgame = solve(env.state, env.player, env.hex_size)
+            print(f"Endgame solved : {len(env.endgame)} positions")
+    # the searches probe the regions once the board has split, until the end
+    if env.game == GOPHER_STR and env.regions is None and board_split(env):
+        env.regions = RegionSolver(env.hex_size)
+        print("Board split into regions")
+
     # playing the best action
-    if env.game == DODO_STR:
-        best_action, env.root = env.strategy_mcts(DODO_NB_SIMU,env.root)
+    budget: float = time_budget(env, time_left)
+    book = load_book(env.game, env.hex_size) if USE_BOOK else None
+    book_action: Action = book.probe(env) if book is not None else None
+    proof_action: Action = None
+    if book_action is None and PNS_CHECK and proof_likely(env):
+        proof_action = env.strategy_pns(PNS_MAX_NODES, budget * PNS_TIME_SHARE)
+        print(
+            f"Proof search : {env.nodes} nodes ({env.nodes_per_second:.0f}/s), "
+            f"{'proven win' if env.proven_win else 'no proof'}"
+        )
+        budget *= 1 - PNS_TIME_SHARE
+    if book_action is not None:
+        best_action = book_action
+        env.root = None
+        print("Book move")
+    elif proof_action is not None and env.proven_win:
+        best_action = proof_action
+        env.root = None
+        print(f"Proof tree : {env.proof_size} positions")
+    elif env.game == DODO_STR:
+        best_action, env.root = env.strategy_mcts(
+            DODO_MAX_SIMU,
+            env.root,
+            workers=DODO_WORKERS,
+            time_budget=budget,
+        )
+        env.root = reroot(env.root.parent, best_action)
+        print(
+            f"Simulations : {env.simulations} "
+            f"({env.simulations_per_second:.0f}/s)"
+        )
     else:
-        best_action = env.strategy_alpha_beta_cache(GOPHER_DEPTH)
+        # the pondering has already started the search of this move
+        if GOPHER_WORKERS > 1:
+            best_action = env.strategy_lazy_smp(
+                budget, GOPHER_MAX_DEPTH, GOPHER_WORKERS, new_search=not PONDER
+            )
+        else:
+            best_action = env.strategy_iterative_deepening(
+                budget, GOPHER_MAX_DEPTH, new_search=not PONDER
+            )
+        print(f"Depth reached : {env.depth_reached}")
+        print(f"Transposition table : {env.cache.stats()}")
+        if env.regions is not None:
+            print(f"Regions : {env.regions.stats()}")
     env.play(best_action)
 
     # convert the action for the api
@@ -167,6 +265,29 @@ def strategy(
     return env, best_action
 
 
+# --------------------------------------
+
+ponder: Ponder = Ponder(GOPHER_MAX_DEPTH)
+
+
+def pondering_strategy(
+    env: Environment, state: State, player: Player, time_left: Time
+) -> tuple[Environment, Action]:
+    """Strategy, the position of the opponent being searched in the background
+    while the client waits for its move"""
+    ponder.stop()
+    print(f"Pondering : {ponder.report()}")
+    env, action = strategy(env, state, player, time_left)
+    ponder.start(env)
+    return env, action
+
+
+def pondering_final_result(state: State, score: Score, player: Player):
+    """Stop the pondering and print the final result of the game"""
+    ponder.stop()
+    final_result(state, score, player)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog="ClientTesting", description="Test the IA02 python client"
@@ -195,7 +316,7 @@ if __name__ == "__main__":
         args.password,
         available_games,
         initialize,
-        strategy,
-        final_result,
+        pondering_strategy if PONDER else strategy,
+        pondering_final_result if PONDER else final_result,
         gui=True,
     )
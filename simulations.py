@@ -4,7 +4,15 @@ import cProfile
 import pstats
 import time
 from client.gndclient import GOPHER_STR, DODO_STR, State, Player, Time, RED
-from tools.game import GameGopher, GameDodo, Environment, new_dodo, empty_grid
+from tools.game import (
+    WIN_SCORE,
+    GameGopher,
+    GameDodo,
+    Environment,
+    new_dodo,
+    empty_grid,
+)
+from tools.mcts import reroot
 
 # board settings
 NAME = DODO_STR  # change the game here (GOPHER_STR or DODO_STR)
@@ -73,10 +81,7 @@ if __name__ == "__main__":
                 action = env.strategy_mc(SIMU)
                 # action = env.strategy_alpha_beta(DEPTH)
                 # action = env.strategy_alpha_beta_cache(DEPTH)
-                if env.root:
-                    for child in env.root.children:
-                        if child.parent_action == action:
-                            env.root = child
+                env.root = reroot(env.root, action)
             else:
                 # change strategy for BLUE player here
                 # action = env.strategy_random()
@@ -104,14 +109,14 @@ if __name__ == "__main__":
                 env.tmp_show()
         end_time_simu = time.time()
 
-        if env.score() == 100:
+        if env.score() == WIN_SCORE:
             victoire_rouge += 1
-        elif env.score() == -100:
+        elif env.score() == -WIN_SCORE:
             victoire_bleu += 1
 
         intermediate_time = time.time()
         print("Temps de simulation : ", end_time_simu - start_time_simu, "s")
-        print("Winner :", "rouge" if env.score() == 100 else "bleu")
+        print("Winner :", "rouge" if env.score() == WIN_SCORE else "bleu")
     MEAN_SIMU_TIME /= NB_ITERATION
     # ---- Affichage du profilage ----
 
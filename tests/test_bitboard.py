@@ -0,0 +1,70 @@
+"""Tests of the bitboard game engines"""
+
+import random
+import pytest
+from client.gndclient import BLUE, DODO_STR, EMPTY, GOPHER_STR, RED
+from tools.bitboard import GameDodoBitboard, GameGopherBitboard
+from tools.game import GameDodo, GameGopher, empty_grid, new_dodo
+
+
+def new_gopher_env() -> GameGopherBitboard:
+    env = GameGopherBitboard(GOPHER_STR, empty_grid(4), RED, 4, 0)
+    for _ in range(3):
+        env.play(env.legals()[0])
+    return env
+
+
+def test_gopher_state_is_read_only():
+    env = new_gopher_env()
+    cell = next(cell for cell, play in env.state.items() if play == EMPTY)
+    with pytest.raises(TypeError):
+        env.state[cell] = RED
+    assert env.cell_owner(cell) == EMPTY
+
+
+def test_gopher_cell_owner_follows_the_moves():
+    env = new_gopher_env()
+    action = env.legals()[0]
+    env.play(action)
+    assert env.cell_owner(action) == BLUE
+    assert env.state[action] == BLUE
+    env.undo(action)
+    assert env.cell_owner(action) == EMPTY
+    assert all(env.cell_owner(cell) == play for cell, play in env.state.items())
+
+
+def test_dodo_state_is_read_only():
+    env = GameDodoBitboard(DODO_STR, new_dodo(4), RED, 4, 0)
+    source, destination = env.legals()[0]
+    with pytest.raises(TypeError):
+        env.state[destination] = RED
+    env.play((source, destination))
+    assert env.cell_owner(source) == EMPTY
+    assert env.cell_owner(destination) == RED
+    assert all(env.cell_owner(cell) == play for cell, play in env.state.items())
+
+
+@pytest.mark.parametrize(
+    "game, engine, bitboard, grid",
+    [
+        (GOPHER_STR, GameGopher, GameGopherBitboard, empty_grid),
+        (DODO_STR, GameDodo, GameDodoBitboard, new_dodo),
+    ],
+)
+@pytest.mark.parametrize("hex_size", [4, 5])
+def test_same_games_as_the_dict_engines(game, engine, bitboard, grid, hex_size):
+    rng = random.Random(hex_size)
+    for _ in range(5):
+        env = engine(game, grid(hex_size), RED, hex_size, 0)
+        env_bitboard = bitboard(game, grid(hex_size), RED, hex_size, 0)
+        while True:
+            leg = env.legals()
+            assert sorted(env_bitboard.legals()) == sorted(leg)
+            assert env_bitboard.final() == env.final()
+            assert env_bitboard.zobrist == env.zobrist
+            if env.final():
+                break
+            action = rng.choice(leg)
+            env.play(action)
+            env_bitboard.play(action)
+        assert env_bitboard.score() == env.score()
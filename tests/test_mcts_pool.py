@@ -0,0 +1,32 @@
+"""Tests of the MCTS on a pool of nodes"""
+
+import pytest
+from client.gndclient import RED, DODO_STR
+from tools.bitboard import GameDodoBitboard
+from tools.game import new_dodo
+from tools.mcts_pool import NO_NODE, NodePool, PoolNode
+
+
+def new_env() -> GameDodoBitboard:
+    return GameDodoBitboard(DODO_STR, new_dodo(4), RED, 4, 0)
+
+
+def test_capacity_too_small_for_the_root():
+    env = new_env()
+    with pytest.raises(ValueError, match="cannot hold"):
+        env.strategy_mcts_pool(100, capacity=len(env.legals()))
+
+
+def test_best_action_without_children():
+    env = new_env()
+    root = PoolNode(NodePool(env.player, 2))
+    root.pool.new_node(NO_NODE, None)
+    with pytest.raises(ValueError, match="cannot hold"):
+        root.best_action(env, nb_simu=10)
+
+
+def test_smallest_capacity():
+    env = new_env()
+    action, child = env.strategy_mcts_pool(100, capacity=len(env.legals()) + 1)
+    assert action in env.legals()
+    assert child.n() > 0
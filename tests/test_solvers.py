@@ -0,0 +1,45 @@
+"""Tests of the exact solvers against a full alpha beta search"""
+
+import random
+import pytest
+from client.gndclient import BLUE, GOPHER_STR, RED
+from tools.bitboard import GameGopherBitboard
+from tools.endgame import solve
+from tools.game import WIN_SCORE, empty_grid
+
+HEX_SIZE = 4
+FULL_DEPTH = 40  # more than the cells of the board
+
+
+def random_position(plies: int, seed: int) -> GameGopherBitboard:
+    rng = random.Random(seed)
+    env = GameGopherBitboard(GOPHER_STR, empty_grid(HEX_SIZE), RED, HEX_SIZE, 0)
+    for _ in range(plies):
+        env.play(rng.choice(env.legals()))
+    return env
+
+
+def alpha_beta_winner(env: GameGopherBitboard) -> int:
+    _, score = env.alpha_beta(FULL_DEPTH, -float("inf"), float("inf"))
+    assert abs(score) == WIN_SCORE
+    return RED if score > 0 else BLUE
+
+
+@pytest.mark.parametrize("plies", [7, 8])
+@pytest.mark.parametrize("seed", range(6))
+def test_endgame_table(plies, seed):
+    env = random_position(plies, seed)
+    table = solve(dict(env.state), env.player, HEX_SIZE)
+    assert table.winner(env) == alpha_beta_winner(env)
+
+
+@pytest.mark.parametrize("plies", [7, 8])
+@pytest.mark.parametrize("seed", range(6))
+def test_proof_number_search(plies, seed):
+    env = random_position(plies, seed)
+    winner = alpha_beta_winner(env)
+    action = env.strategy_pns()
+    assert env.proven_win == (winner == env.player)
+    if env.proven_win:
+        env.play(action)
+        assert alpha_beta_winner(env) == winner
@@ -0,0 +1,46 @@
+"""Tests of the keys of the states up to the symmetries of the board"""
+
+import random
+from client.gndclient import GOPHER_STR, RED
+from tools.bitboard import GameGopherBitboard
+from tools.endgame import canonical
+from tools.game import GOPHER_SYMMETRIES, empty_grid, map_action
+from tools.hexagons import NB_BOARD_SYMMETRIES, board_symmetries
+
+HEX_SIZE = 5
+
+
+def random_game(plies: int, seed: int) -> list:
+    rng = random.Random(seed)
+    env = GameGopherBitboard(GOPHER_STR, empty_grid(HEX_SIZE), RED, HEX_SIZE, 0)
+    moves = []
+    for _ in range(plies):
+        action = rng.choice(env.legals())
+        env.play(action)
+        moves.append(action)
+    return moves
+
+
+def play_image(moves: list, k: int) -> GameGopherBitboard:
+    """Play the image of the moves by the symmetry k, the keys of the
+    symmetries being used from the first pawn"""
+    table = board_symmetries(HEX_SIZE)[k]
+    env = GameGopherBitboard(GOPHER_STR, empty_grid(HEX_SIZE), RED, HEX_SIZE, 0)
+    env.play(map_action(moves[0], table))
+    env.update_symmetries()
+    for action in moves[1:]:
+        env.play(map_action(action, table))
+    return env
+
+
+def test_canonical_key_of_the_symmetric_images():
+    for seed in range(5):
+        moves = random_game(8, seed)
+        images = [play_image(moves, k) for k in range(NB_BOARD_SYMMETRIES)]
+        keys = {env.canonical_key()[0] for env in images}
+        assert len(keys) == 1
+        # the plain keys of the images differ
+        assert len({env.zobrist for env in images}) > 1
+        env = images[0]
+        assert keys == {canonical(env.state, env.player, HEX_SIZE, GOPHER_SYMMETRIES)}
+
@@ -0,0 +1,165 @@
+"""Random playouts of many games at once with NumPy"""
+
+from functools import lru_cache
+import numpy as np
+
+from client.gndclient import Player, RED, BLUE, EMPTY, GOPHER_STR
+from tools.hexagons import (
+    DODO_FORWARD,
+    GOPHER_DIRECTIONS,
+    Hex,
+    axial_to_cube,
+    DoubledCoord,
+)
+
+# value of the extra column which stands for the cells outside of the board
+OUTSIDE = 3
+
+rng: np.random.Generator = np.random.default_rng()
+
+
+def seed(value: int):
+    """Seed the generator of the batched playouts"""
+    global rng
+    rng = np.random.default_rng(value)
+
+
+class BatchRollout:
+    """Play N random games at once from the same position
+
+    The boards are a (N, cells + 1) array, the last column being outside of
+    the board. All the games have the same player to move at each step, since
+    every game still running plays one move per step.
+    """
+
+    def __init__(self, game: str, hex_size: int):
+        h: int = hex_size - 1
+        self.game: str = game
+        self.cells: list[Hex] = []
+        for r in range(h, -h - 1, -1):
+            for q in range(max(-h, r - h), min(h, r + h) + 1):
+                self.cells.append(Hex(q, r, -q - r))
+        self.index: dict[Hex, int] = {cell: i for i, cell in enumerate(self.cells)}
+        nb_cells: int = len(self.cells)
+
+        def adjacency(directions: list[tuple[int, int]]) -> np.ndarray:
+            """Index of the neighbour of each cell in each direction"""
+            res = np.full((nb_cells, len(directions)), nb_cells, dtype=np.intp)
+            for i, cell in enumerate(self.cells):
+                for d, (dq, dr) in enumerate(directions):
+                    neighbor = Hex(cell.q + dq, cell.r + dr, -cell.q - dq - cell.r - dr)
+                    res[i, d] = self.index.get(neighbor, nb_cells)
+            return res
+
+        self.neighbors: np.ndarray = adjacency(GOPHER_DIRECTIONS)
+        self.forward: dict[Player, np.ndarray] = {
+            player: adjacency(directions) for player, directions in DODO_FORWARD.items()
+        }
+        self.first_move: int = self.index[axial_to_cube(DoubledCoord(0, hex_size - 1))]
+
+    def rollouts(self, state: dict, player: Player, nb: int) -> int:
+        """Play nb random games from the state, return the number of RED wins"""
+        start = np.full(len(self.cells) + 1, OUTSIDE, dtype=np.int8)
+        for cell, play in state.items():
+            start[self.index[cell]] = play
+        boards: np.ndarray = np.tile(start, (nb, 1))
+        if self.game == GOPHER_STR:
+            return self._gopher(boards, player)
+        return self._dodo(boards, player)
+
+    @staticmethod
+    def _choose(legal: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Index of a uniform random True of each row, counts being the number
+        of True of each row (not 0)"""
+        nth = (rng.random(len(legal)) * counts).astype(np.int16)
+        return (legal.cumsum(axis=1, dtype=np.int16) > nth[:, None]).argmax(axis=1)
+
+    def _gopher(self, boards: np.ndarray, player: Player) -> int:
+        """Gopher playouts: the player who cannot play loses"""
+        nb_cells: int = len(self.cells)
+        red_wins: int = 0
+
+        # first move of an empty board
+        if not (boards[0, :nb_cells] != EMPTY).any():
+            boards[:, self.first_move] = player
+            player = 3 - player
+
+        # number of adjacent pawns of each player, extra column for the outside
+        adjacent: dict[Player, np.ndarray] = {}
+        for p in (RED, BLUE):
+            pawns = np.append(boards[0, :nb_cells] == p, False)
+            counts = pawns[self.neighbors].sum(axis=1).astype(np.int8)
+            adjacent[p] = np.tile(np.append(counts, 0), (len(boards), 1))
+
+        # finished games are only removed once they are numerous enough
+        done: np.ndarray = np.zeros(len(boards), dtype=bool)
+        while True:
+            legal = (boards == EMPTY) & (adjacent[3 - player] == 1)
+            legal &= adjacent[player] == 0
+            counts = legal.sum(axis=1)
+            finished = (counts == 0) & ~done
+            if player == BLUE:
+                red_wins += int(finished.sum())
+            done |= finished
+            if done.all():
+                return red_wins
+            if 4 * done.sum() > len(done):
+                running = ~done
+                boards, legal, counts = boards[running], legal[running], counts[running]
+                adjacent = {p: a[running] for p, a in adjacent.items()}
+                done = done[running]
+
+            # uniform random legal move in every running game
+            rows = np.flatnonzero(~done)
+            moves = self._choose(legal[rows], counts[rows])
+            boards[rows, moves] = player
+            adjacent[player][rows[:, None], self.neighbors[moves]] += 1
+            player = 3 - player
+
+    def _dodo(self, boards: np.ndarray, player: Player) -> int:
+        """Dodo playouts: the player who cannot play wins"""
+        red_wins: int = 0
+
+        # the pawns are never taken: cells in front of each pawn of each player,
+        # targets[p][i, k, d] being in front of the pawn k of game i in direction d
+        pawns: dict[Player, np.ndarray] = {}
+        targets: dict[Player, np.ndarray] = {}
+        for p in (RED, BLUE):
+            cells = np.flatnonzero(boards[0] == p)
+            pawns[p] = np.tile(cells, (len(boards), 1))
+            targets[p] = self.forward[p][pawns[p]]
+
+        done: np.ndarray = np.zeros(len(boards), dtype=bool)
+        while True:
+            rows = np.arange(len(boards))[:, None, None]
+            legal = boards[rows, targets[player]] == EMPTY
+            legal = legal.reshape(len(boards), -1)
+            counts = legal.sum(axis=1)
+            finished = (counts == 0) & ~done
+            if player == RED:
+                red_wins += int(finished.sum())
+            done |= finished
+            if done.all():
+                return red_wins
+            if 4 * done.sum() > len(done):
+                running = ~done
+                boards, legal, counts = boards[running], legal[running], counts[running]
+                pawns = {p: a[running] for p, a in pawns.items()}
+                targets = {p: a[running] for p, a in targets.items()}
+                done = done[running]
+
+            rows = np.flatnonzero(~done)
+            moves = self._choose(legal[rows], counts[rows])
+            pawn = moves // len(DODO_FORWARD[player])
+            destinations = targets[player].reshape(len(boards), -1)[rows, moves]
+            boards[rows, pawns[player][rows, pawn]] = EMPTY
+            boards[rows, destinations] = player
+            pawns[player][rows, pawn] = destinations
+            targets[player][rows, pawn] = self.forward[player][destinations]
+            player = 3 - player
+
+
+@lru_cache(maxsize=None)
+def batch_rollout(game: str, hex_size: int) -> BatchRollout:
+    """Return the (shared) batched playout engine of a game and a board size"""
+    return BatchRollout(game, hex_size)
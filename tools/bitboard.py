@@ -0,0 +1,436 @@
+"""Bitboard game engines"""
+
+import random
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
+from client.gndclient import (
+    Player,
+    Time,
+    BLUE,
+    RED,
+    EMPTY,
+    ActionGopher,
+    ActionDodo,
+    Score,
+)
+from tools.hexagons import (
+    DODO_FORWARD,
+    GOPHER_DIRECTIONS,
+    Hex,
+    axial_to_cube,
+    DoubledCoord,
+)
+from tools.game import WIN_SCORE, Game, StatePerso, empty_grid
+from tools.mcts import MCTSNode
+
+
+# --------------------------------------
+
+
+class BoardLayout:
+    """Mapping between the cells of a board and the bits of an integer
+
+    Cell (q, r) is stored at bit (r + h) * width + (q + h), with one spare
+    column per row so that a shift never wraps a cell onto the next row.
+    """
+
+    def __init__(self, hex_size: int):
+        h: int = hex_size - 1
+        self.hex_size: int = hex_size
+        self.width: int = 2 * h + 2
+        self.cells: list[Hex] = list(empty_grid(hex_size))
+
+        # cell <-> bit index
+        self.index: dict[Hex, int] = {}
+        self.bit: dict[Hex, int] = {}
+        self.hexes: list[Hex] = [None] * ((2 * h + 1) * self.width)
+        self.mask: int = 0
+        for cell in self.cells:
+            i = (cell.r + h) * self.width + (cell.q + h)
+            self.index[cell] = i
+            self.bit[cell] = 1 << i
+            self.hexes[i] = cell
+            self.mask |= 1 << i
+
+        # shift of the neighbour index in each direction
+        self.shifts: list[int] = [dq + dr * self.width for dq, dr in GOPHER_DIRECTIONS]
+
+        # neighbours of each cell as a mask
+        self.neighbors: list[int] = [0] * len(self.hexes)
+        for cell, i in self.index.items():
+            for k in self.shifts:
+                if 0 <= i + k < len(self.hexes) and self.hexes[i + k] is not None:
+                    self.neighbors[i] |= 1 << (i + k)
+
+        # Dodo forward moves: (shift, cells whose forward cell is on the board,
+        # move starting from each bit)
+        self.forward: dict[Player, list[tuple[int, int, list[ActionDodo]]]] = {}
+        for player, directions in DODO_FORWARD.items():
+            self.forward[player] = []
+            for dq, dr in directions:
+                k = dq + dr * self.width
+                valid = 0
+                moves: list[ActionDodo] = [None] * len(self.hexes)
+                for cell, i in self.index.items():
+                    if 0 <= i + k < len(self.hexes) and self.hexes[i + k] is not None:
+                        valid |= 1 << i
+                        moves[i] = (cell, self.hexes[i + k])
+                self.forward[player].append((k, valid, moves))
+
+        # first move of Gopher, same as GameGopher
+        self.first_move: Hex = axial_to_cube(DoubledCoord(0, hex_size - 1))
+
+    def cells_of(self, mask: int) -> list[Hex]:
+        """Return the cells of the bits set in the mask"""
+        res: list[Hex] = []
+        hexes = self.hexes
+        while mask:
+            low = mask & -mask
+            res.append(hexes[low.bit_length() - 1])
+            mask ^= low
+        return res
+
+
+@lru_cache(maxsize=None)
+def board_layout(hex_size: int) -> BoardLayout:
+    """Return the (shared) layout of a board of size hex_size"""
+    return BoardLayout(hex_size)
+
+
+def neighbor_counts(
+    friendly: int, enemy: int, right: list[int], left: list[int]
+) -> tuple[int, int, int]:
+    """Return the cells with a friendly neighbour, and the ones with at least
+    one and at least two enemy neighbours, the neighbours being at the right
+    and left shifts of a cell"""
+    near_friendly: int = 0
+    once: int = 0
+    twice: int = 0
+    for k in right:
+        e = enemy >> k
+        twice |= once & e
+        once |= e
+        near_friendly |= friendly >> k
+    for k in left:
+        e = enemy << k
+        twice |= once & e
+        once |= e
+        near_friendly |= friendly << k
+    return near_friendly, once, twice
+
+
+# --------------------------------------
+
+
+class GameGopherBitboard(Game):
+    """Game Gopher class, each colour stored as a bitmask"""
+
+    def __init__(
+        self,
+        game: str,
+        state: StatePerso,
+        player: Player,
+        hex_size: int,
+        total_time: Time,
+        root: MCTSNode = None,
+    ):
+        self._layout: BoardLayout = board_layout(hex_size)
+        self._red: int = 0
+        self._blue: int = 0
+
+        # the state is loaded in the masks by the setter
+        super().__init__(game, state, player, hex_size, total_time, root)
+
+        # directions splitted by sign to avoid negative shifts
+        self._right_shifts: list[int] = [k for k in self._layout.shifts if k > 0]
+        self._left_shifts: list[int] = [-k for k in self._layout.shifts if k < 0]
+
+    @property
+    def state(self) -> Mapping[Hex, Player]:
+        """State of the game, rebuilt from the masks: a read only view, the
+        moves go through play and undo (cell_owner reads a single cell)"""
+        bit = self._layout.bit
+        res: StatePerso = {}
+        for cell in self._layout.cells:
+            if self._red & bit[cell]:
+                res[cell] = RED
+            elif self._blue & bit[cell]:
+                res[cell] = BLUE
+            else:
+                res[cell] = EMPTY
+        return MappingProxyType(res)
+
+    @state.setter
+    def state(self, state: StatePerso):
+        bit = self._layout.bit
+        self._red = 0
+        self._blue = 0
+        for cell, play in state.items():
+            if play == RED:
+                self._red |= bit[cell]
+            elif play == BLUE:
+                self._blue |= bit[cell]
+
+    def cell_owner(self, cell: Hex) -> Player:
+        """Return the player on the cell, EMPTY if there is none"""
+        bit: int = self._layout.bit[cell]
+        if self._red & bit:
+            return RED
+        if self._blue & bit:
+            return BLUE
+        return EMPTY
+
+    def legal_mask(self) -> int:
+        """Return the legal moves for the current player as a mask"""
+        if self.player == RED:
+            return self._legal_mask(self._red, self._blue)
+        return self._legal_mask(self._blue, self._red)
+
+    def _legal_mask(self, friendly: int, enemy: int) -> int:
+        """Return the cells with one enemy neighbour and no friendly one"""
+        near_friendly, once, twice = neighbor_counts(
+            friendly, enemy, self._right_shifts, self._left_shifts
+        )
+        empty: int = self._layout.mask & ~(friendly | enemy)
+        return empty & once & ~twice & ~near_friendly
+
+    def open_mask(self, friendly: int, enemy: int) -> int:
+        """Return the empty cells where the friendly player can play now or
+        later: no friendly neighbour and at most one enemy neighbour"""
+        near_friendly, _, twice = neighbor_counts(
+            friendly, enemy, self._right_shifts, self._left_shifts
+        )
+        empty: int = self._layout.mask & ~(friendly | enemy)
+        return empty & ~twice & ~near_friendly
+
+    def legals(self) -> list[ActionGopher]:
+        """Return the legal moves for the current player"""
+        # first move can be anywhere
+        if not self._red and not self._blue:
+            return [self._layout.first_move]
+        return self._layout.cells_of(self.legal_mask())
+
+    def final(self) -> bool:
+        """Return True if the game is over"""
+        if not self._red and not self._blue:
+            return False
+        return not self.legal_mask()
+
+    def random_playout(self, moves: dict[Player, set] = None) -> Player:
+        """Play random moves until the end of the game and return the winner,
+        on local copies of the masks: the state is never modified. The cells
+        played by each player are added to moves if given."""
+        if not self._red and not self._blue:
+            self.play(self._layout.first_move)
+            winner: Player = self.random_playout(moves)
+            self.undo(self._layout.first_move)
+            if moves is not None:
+                moves[self.player].add(self._layout.first_move)
+            return winner
+
+        player: Player = self.player
+        friendly, enemy = (
+            (self._red, self._blue) if player == RED else (self._blue, self._red)
+        )
+        legal: int = self._legal_mask(friendly, enemy)
+        while legal:
+            # the n-th legal cell, without building the list of moves
+            for _ in range(random.randrange(legal.bit_count())):
+                legal &= legal - 1
+            friendly |= legal & -legal
+            player = 3 - player
+            friendly, enemy = enemy, friendly
+            legal = self._legal_mask(friendly, enemy)
+
+        if moves is not None:
+            red, blue = (friendly, enemy) if player == RED else (enemy, friendly)
+            moves[RED].update(self._layout.cells_of(red & ~self._red))
+            moves[BLUE].update(self._layout.cells_of(blue & ~self._blue))
+        # the player who cannot play loses
+        return 3 - player
+
+    def play(self, action: ActionGopher):
+        """Play the move"""
+        self._zobrist ^= self._keys[action][self.player] ^ self._side_key
+        if self.player == RED:
+            self._red |= self._layout.bit[action]
+        else:
+            self._blue |= self._layout.bit[action]
+        self.player = 3 - self.player
+
+    def undo(self, action: ActionGopher):
+        """Undo the move"""
+        self.player = 3 - self.player
+        self._zobrist ^= self._keys[action][self.player] ^ self._side_key
+        if self.player == RED:
+            self._red ^= self._layout.bit[action]
+        else:
+            self._blue ^= self._layout.bit[action]
+
+    def score(self) -> Score:
+        """Return the score of the game"""
+        return -WIN_SCORE if self.player == RED else WIN_SCORE
+
+    def heuristic_evaluation(self, leg) -> Score:
+        """Heuristic evaluation based on the number of legals moves"""
+        if self.player == RED:
+            return len(leg)
+        return -len(leg)
+
+
+class GameDodoBitboard(Game):
+    """Game Dodo class, each colour stored as a bitmask"""
+
+    def __init__(
+        self,
+        game: str,
+        state: StatePerso,
+        player: Player,
+        hex_size: int,
+        total_time: Time,
+        root: MCTSNode = None,
+    ):
+        self._layout: BoardLayout = board_layout(hex_size)
+        self._red: int = 0
+        self._blue: int = 0
+
+        # the state is loaded in the masks by the setter
+        super().__init__(game, state, player, hex_size, total_time, root)
+
+    @property
+    def state(self) -> Mapping[Hex, Player]:
+        """State of the game, rebuilt from the masks: a read only view, the
+        moves go through play and undo (cell_owner reads a single cell)"""
+        bit = self._layout.bit
+        res: StatePerso = {}
+        for cell in self._layout.cells:
+            if self._red & bit[cell]:
+                res[cell] = RED
+            elif self._blue & bit[cell]:
+                res[cell] = BLUE
+            else:
+                res[cell] = EMPTY
+        return MappingProxyType(res)
+
+    @state.setter
+    def state(self, state: StatePerso):
+        bit = self._layout.bit
+        self._red = 0
+        self._blue = 0
+        for cell, play in state.items():
+            if play == RED:
+                self._red |= bit[cell]
+            elif play == BLUE:
+                self._blue |= bit[cell]
+
+    def cell_owner(self, cell: Hex) -> Player:
+        """Return the player on the cell, EMPTY if there is none"""
+        bit: int = self._layout.bit[cell]
+        if self._red & bit:
+            return RED
+        if self._blue & bit:
+            return BLUE
+        return EMPTY
+
+    def legals(self) -> list[ActionDodo]:
+        """Return the legal moves for the current player"""
+        res: list[ActionDodo] = []
+        empty: int = self._layout.mask & ~(self._red | self._blue)
+        pawns: int = self._red if self.player == RED else self._blue
+
+        # pawns whose forward cell in the direction is empty
+        for k, valid, moves in self._layout.forward[self.player]:
+            if k > 0:
+                movers = pawns & valid & (empty >> k)
+            else:
+                movers = pawns & valid & (empty << -k)
+            while movers:
+                low = movers & -movers
+                res.append(moves[low.bit_length() - 1])
+                movers ^= low
+
+        return res
+
+    def final(self) -> bool:
+        """Return True if the game is over"""
+        empty: int = self._layout.mask & ~(self._red | self._blue)
+        pawns: int = self._red if self.player == RED else self._blue
+        for k, valid, _ in self._layout.forward[self.player]:
+            if k > 0:
+                if pawns & valid & (empty >> k):
+                    return False
+            elif pawns & valid & (empty << -k):
+                return False
+        return True
+
+    def random_playout(self, moves: dict[Player, set] = None) -> Player:
+        """Play random moves until the end of the game and return the winner,
+        on local copies of the masks: the state is never modified. The moves
+        played by each player are added to moves if given."""
+        player: Player = self.player
+        pawns: dict[Player, int] = {RED: self._red, BLUE: self._blue}
+        forward = self._layout.forward
+        board: int = self._layout.mask
+        while True:
+            empty: int = board & ~(pawns[RED] | pawns[BLUE])
+            own: int = pawns[player]
+            # pawns able to move in each direction
+            movers: list[tuple[int, int, list[ActionDodo]]] = []
+            total: int = 0
+            for k, valid, actions in forward[player]:
+                mask = own & valid & (empty >> k if k > 0 else empty << -k)
+                if mask:
+                    movers.append((k, mask, actions))
+                    total += mask.bit_count()
+            if not total:
+                # the player who cannot play wins
+                return player
+
+            # the n-th move, without building the list of moves
+            n: int = random.randrange(total)
+            for k, mask, actions in movers:
+                count = mask.bit_count()
+                if n < count:
+                    break
+                n -= count
+            for _ in range(n):
+                mask &= mask - 1
+            low = mask & -mask
+            if moves is not None:
+                moves[player].add(actions[low.bit_length() - 1])
+            pawns[player] = own ^ (low | (low << k if k > 0 else low >> -k))
+            player = 3 - player
+
+    def play(self, action: ActionDodo):
+        """Play the move"""
+        keys = self._keys[action[0]][self.player] ^ self._keys[action[1]][self.player]
+        self._zobrist ^= keys ^ self._side_key
+        bit = self._layout.bit
+        if self.player == RED:
+            self._red ^= bit[action[0]] | bit[action[1]]
+        else:
+            self._blue ^= bit[action[0]] | bit[action[1]]
+        self.player = 3 - self.player
+
+    def undo(self, action: ActionDodo):
+        """Undo the move"""
+        self.player = 3 - self.player
+        keys = self._keys[action[0]][self.player] ^ self._keys[action[1]][self.player]
+        self._zobrist ^= keys ^ self._side_key
+        bit = self._layout.bit
+        if self.player == RED:
+            self._red ^= bit[action[0]] | bit[action[1]]
+        else:
+            self._blue ^= bit[action[0]] | bit[action[1]]
+
+    def score(self) -> Score:
+        """Return the score of the game"""
+        return WIN_SCORE if self.player == RED else -WIN_SCORE
+
+    def heuristic_evaluation(self, leg) -> Score:
+        """Heuristic evaluation based on the number of legals moves"""
+        # less legals moves is better
+        if self.player == RED:
+            return -len(leg)
+        return len(leg)
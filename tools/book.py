@@ -0,0 +1,119 @@
+"""Opening book: the searched move of the positions of the first plies, in a
+sorted binary file read through a memory map"""
+
+from functools import lru_cache
+import mmap
+import os
+import struct
+from typing import Optional
+
+from client.gndclient import Action, Player, Score, GOPHER_STR
+from tools.game import DODO_SYMMETRIES, GOPHER_SYMMETRIES, StatePerso, map_action
+from tools.hexagons import board_symmetries, inverse_symmetry
+from tools.shared_tt import ActionCodec
+from tools.zobrist import KEY_BITS, zobrist_hash
+
+# directory of the books, one file per game and board size
+BOOK_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "books")
+
+MAGIC = b"GDBK"
+VERSION = 1
+
+# header: magic, version, board size, number of records
+HEADER = struct.Struct("<4sHHI")
+# record: key of the position, move (ActionCodec), score of the search
+RECORD = struct.Struct("<QIh")
+
+BookEntry = tuple[int, Score]  # move code, score
+
+
+def book_path(game: str, hex_size: int) -> str:
+    """Return the path of the book of a game and a board size"""
+    return os.path.join(BOOK_DIR, f"{game}_{hex_size}.book")
+
+
+def book_key(
+    game: str, state: StatePerso, player: Player, hex_size: int
+) -> tuple[int, int]:
+    """Key of a position up to the symmetries of the board, whatever the
+    symmetries used by the searches: the smallest key of its images, and the
+    index (in board_symmetries) of the symmetry which gives that image"""
+    symmetries = GOPHER_SYMMETRIES if game == GOPHER_STR else DODO_SYMMETRIES
+    packed: int = zobrist_hash(state, player, hex_size, symmetries)
+    size: int = KEY_BITS // 8 * len(symmetries)
+    keys: list[int] = memoryview(packed.to_bytes(size, "little")).cast("Q").tolist()
+    key: int = min(keys)
+    return key, symmetries[keys.index(key)]
+
+
+def write_book(
+    path: str, hex_size: int, entries: dict[int, tuple[Action, Score]]
+):
+    """Write the book of a board size, entries giving the move (in the frame of
+    the image of book_key) and the score of each key"""
+    codec = ActionCodec(hex_size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, hex_size, len(entries)))
+        for key in sorted(entries):
+            move, score = entries[key]
+            file.write(RECORD.pack(key, codec.encode(move), int(score)))
+
+
+class OpeningBook:
+    """Book file mapped in memory: nothing is read before the first probe,
+    which is a binary search on the sorted records"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._map: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hex_size, size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a book of version {VERSION}")
+        self.hex_size: int = hex_size
+        self.size: int = size
+        self._codec: ActionCodec = ActionCodec(hex_size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def find(self, key: int) -> Optional[BookEntry]:
+        """Return the move code and the score of a key, or None"""
+        low, high = 0, self.size
+        while low < high:
+            middle: int = (low + high) // 2
+            offset: int = HEADER.size + middle * RECORD.size
+            found, move, score = RECORD.unpack_from(self._map, offset)
+            if found == key:
+                return move, score
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def probe(self, env) -> Action:
+        """Return the book move of the position of env, None if it is not in
+        the book"""
+        key, symmetry = book_key(env.game, env.state, env.player, env.hex_size)
+        entry: Optional[BookEntry] = self.find(key)
+        if entry is None:
+            return None
+        table = board_symmetries(self.hex_size)[inverse_symmetry(symmetry)]
+        action: Action = map_action(self._codec.decode(entry[0]), table)
+        # a collision of the keys would give any move
+        return action if action in env.legals() else None
+
+    def close(self):
+        """Unmap the file"""
+        self._map.close()
+
+
+@lru_cache(maxsize=None)
+def load_book(game: str, hex_size: int) -> Optional[OpeningBook]:
+    """Return the book of a game and a board size, None if it was not built"""
+    path: str = book_path(game, hex_size)
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
@@ -0,0 +1,258 @@
+"""Exact Gopher endgames: the outcome of every position reachable from a start,
+solved backward from the last moves (retrograde analysis) and stored as sorted
+keys with one bit of outcome per position"""
+
+from functools import lru_cache
+import mmap
+import os
+import struct
+from typing import Optional
+import numpy as np
+
+from client.gndclient import Action, Player, RED, BLUE, GOPHER_STR
+from tools.bitboard import GameGopherBitboard, board_layout
+from tools.game import GOPHER_SYMMETRIES, StatePerso, empty_grid
+from tools.zobrist import (
+    IDENTITY,
+    KEY_BITS,
+    symmetric_keys,
+    symmetric_side_key,
+    zobrist_hash,
+)
+
+# directory of the tables of the small boards, one file per board size
+TABLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tables")
+
+MAGIC = b"GDEG"
+VERSION = 1
+
+# header: magic, version, board size, number of positions; then the sorted
+# keys (8 bytes each) and the outcomes (1 bit each, packed)
+HEADER = struct.Struct("<4sHHQ")
+
+# board sizes small enough to be solved from the empty board (size 5 has too
+# many positions to be enumerated in Python)
+TABLE_SIZES = (3, 4)
+
+# larger boards are solved during the game once they have at most this number
+# of empty cells where a player can still play
+LIVE_CELLS_MAX = 20
+
+
+class EndgameTable:
+    """Outcome of positions for the player to move, True when it wins
+
+    The keys are the Zobrist keys of the positions up to the given symmetries
+    (the smallest key of their images, as Game.canonical_key).
+    """
+
+    def __init__(
+        self,
+        hex_size: int,
+        keys: np.ndarray,
+        bits: np.ndarray,
+        symmetries: tuple[int, ...] = IDENTITY,
+    ):
+        self.hex_size: int = hex_size
+        self.keys: np.ndarray = keys
+        self.bits: np.ndarray = bits
+        self.symmetries: tuple[int, ...] = symmetries
+        self._map: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def probe_key(self, key: int) -> Optional[bool]:
+        """Return True if the player to move wins the position of the key,
+        False if it loses, None if the position is not in the table"""
+        i: int = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        return bool(self.bits[i >> 3] >> (7 - (i & 7)) & 1)
+
+    def probe(self, env) -> Optional[bool]:
+        """Return True if the player to move wins the position of env, False if
+        it loses, None if the position is not in the table"""
+        if env._symmetries == self.symmetries:
+            return self.probe_key(env.canonical_key()[0])
+        return self.probe_key(
+            canonical(env.state, env.player, self.hex_size, self.symmetries)
+        )
+
+    def winner(self, env) -> Player:
+        """Return the winner of the position of env, None if it is unknown"""
+        won: Optional[bool] = self.probe(env)
+        if won is None:
+            return None
+        return env.player if won else 3 - env.player
+
+    def best_move(self, env) -> Action:
+        """Return a winning move of the position of env if it has one, any
+        move if it is lost, None if the position is not in the table"""
+        if self.probe(env) is None:
+            return None
+        leg: list[Action] = env.legals()
+        for action in leg:
+            env.play(action)
+            won: Optional[bool] = self.probe(env)
+            env.undo(action)
+            if won is False:
+                return action
+        return leg[0] if leg else None
+
+    def nbytes(self) -> int:
+        """Return the memory used by the keys and the outcomes"""
+        return self.keys.nbytes + self.bits.nbytes
+
+    def save(self, path: str):
+        """Write the table to a file"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.hex_size, len(self.keys)))
+            file.write(self.keys.tobytes())
+            file.write(self.bits.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "EndgameTable":
+        """Map a table file in memory, the keys and outcomes being read from
+        the file by the probes"""
+        with open(path, "rb") as file:
+            table_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hex_size, size = HEADER.unpack_from(table_map, 0)
+        if magic != MAGIC or version != VERSION:
+            table_map.close()
+            raise ValueError(f"{path} is not an endgame table of version {VERSION}")
+        keys = np.frombuffer(table_map, np.uint64, size, HEADER.size)
+        bits = np.frombuffer(
+            table_map, np.uint8, (size + 7) // 8, HEADER.size + keys.nbytes
+        )
+        res = cls(hex_size, keys, bits, GOPHER_SYMMETRIES)
+        res._map = table_map
+        return res
+
+
+def canonical(
+    state: StatePerso, player: Player, hex_size: int, symmetries: tuple[int, ...]
+) -> int:
+    """Key of a position up to the symmetries, computed from scratch"""
+    packed: int = zobrist_hash(state, player, hex_size, symmetries)
+    size: int = KEY_BITS // 8 * len(symmetries)
+    return min(memoryview(packed.to_bytes(size, "little")).cast("Q").tolist())
+
+
+def solve(
+    state: StatePerso,
+    player: Player,
+    hex_size: int,
+    symmetries: tuple[int, ...] = IDENTITY,
+) -> EndgameTable:
+    """Solve every position reachable from a state: they are enumerated one
+    move after the other, then solved from the last ones backward, a position
+    being won if one of its moves leads to a lost position. On the empty board,
+    every first move is enumerated, not only the one played by the engines."""
+    env = GameGopherBitboard(GOPHER_STR, state, player, hex_size, 0)
+    layout = board_layout(hex_size)
+    packed_keys = symmetric_keys(hex_size, symmetries)
+    cell_keys: dict[Player, list[int]] = {RED: [0] * len(layout.hexes)}
+    cell_keys[BLUE] = list(cell_keys[RED])
+    for cell, i in layout.index.items():
+        for play in (RED, BLUE):
+            cell_keys[play][i] = packed_keys[cell][play]
+    side_key: int = symmetric_side_key(symmetries)
+    nb_bytes: int = KEY_BITS // 8 * len(symmetries)
+
+    def key_of(packed: int) -> int:
+        """Canonical key of the packed keys of a position"""
+        if len(symmetries) == 1:
+            return packed
+        return min(memoryview(packed.to_bytes(nb_bytes, "little")).cast("Q").tolist())
+
+    def moves(red: int, blue: int, to_move: Player):
+        """Yield the bit index and the masks of each move of a position"""
+        if not red and not blue:
+            legal: int = layout.mask
+        elif to_move == RED:
+            legal = env._legal_mask(red, blue)
+        else:
+            legal = env._legal_mask(blue, red)
+        while legal:
+            low: int = legal & -legal
+            legal ^= low
+            if to_move == RED:
+                yield low.bit_length() - 1, red | low, blue
+            else:
+                yield low.bit_length() - 1, red, blue | low
+
+    # positions of each ply: canonical key -> (red, blue, packed keys)
+    root_packed: int = zobrist_hash(state, player, hex_size, symmetries)
+    plies: list[dict[int, tuple[int, int, int]]] = [
+        {key_of(root_packed): (env._red, env._blue, root_packed)}
+    ]
+    to_move: Player = player
+    while plies[-1]:
+        following: dict[int, tuple[int, int, int]] = {}
+        for red, blue, packed in plies[-1].values():
+            for i, next_red, next_blue in moves(red, blue, to_move):
+                next_packed: int = packed ^ cell_keys[to_move][i] ^ side_key
+                following.setdefault(
+                    key_of(next_packed), (next_red, next_blue, next_packed)
+                )
+        plies.append(following)
+        to_move = 3 - to_move
+    plies.pop()
+
+    # outcomes from the last ply backward
+    keys: list[int] = []
+    outcomes: list[bool] = []
+    following_won: dict[int, bool] = {}
+    for ply in range(len(plies) - 1, -1, -1):
+        to_move = player if ply % 2 == 0 else 3 - player
+        won: dict[int, bool] = {}
+        for key, (red, blue, packed) in plies[ply].items():
+            won[key] = any(
+                not following_won[key_of(packed ^ cell_keys[to_move][i] ^ side_key)]
+                for i, _, _ in moves(red, blue, to_move)
+            )
+        keys.extend(won)
+        outcomes.extend(won.values())
+        following_won = won
+        plies[ply] = None  # frees the positions of the ply
+
+    sorted_keys = np.array(keys, dtype=np.uint64)
+    order = np.argsort(sorted_keys, kind="stable")
+    bits = np.packbits(np.array(outcomes, dtype=bool)[order])
+    return EndgameTable(hex_size, sorted_keys[order], bits, symmetries)
+
+
+def solve_board(hex_size: int) -> EndgameTable:
+    """Solve every position of a board, up to its symmetries"""
+    return solve(empty_grid(hex_size), RED, hex_size, GOPHER_SYMMETRIES)
+
+
+def live_cells(env) -> int:
+    """Return the number of empty cells where a player can play now or later:
+    no pawn of its own and at most one of the opponent around"""
+    red: int = 0
+    blue: int = 0
+    bit = board_layout(env.hex_size).bit
+    for cell, play in env.state.items():
+        if play == RED:
+            red |= bit[cell]
+        elif play == BLUE:
+            blue |= bit[cell]
+    board = GameGopherBitboard(GOPHER_STR, {}, RED, env.hex_size, 0)
+    return (board.open_mask(red, blue) | board.open_mask(blue, red)).bit_count()
+
+
+def table_path(hex_size: int) -> str:
+    """Return the path of the table of a board size"""
+    return os.path.join(TABLE_DIR, f"gopher_{hex_size}.table")
+
+
+@lru_cache(maxsize=None)
+def load_table(hex_size: int) -> Optional[EndgameTable]:
+    """Return the table of a board size, None if it was not built"""
+    path: str = table_path(hex_size)
+    if not os.path.exists(path):
+        return None
+    return EndgameTable.load(path)
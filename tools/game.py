@@ -1,11 +1,13 @@
 """Game class and functions"""
 
-from typing import Union
+from typing import Callable, Optional, Union
 import random
-from collections import deque
+import time
 import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon
 from tools.hexagons import (
+    BOARD_MIRROR,
+    NB_BOARD_SYMMETRIES,
     Hex,
     Layout,
     Point,
@@ -14,6 +16,8 @@ from tools.hexagons import (
     hex_to_pixel,
     axial_to_cube,
     DoubledCoord,
+    board_symmetries,
+    inverse_symmetry,
 )
 from client.gndclient import (
     Player,
@@ -28,7 +32,37 @@ from client.gndclient import (
     ActionDodo,
     Score,
 )
+from tools.batch import batch_rollout
 from tools.mcts import MCTSNode
+from tools.mcts_pool import NO_NODE, POOL_SIZE, NodePool, PoolNode
+from tools.ordering import MoveOrdering
+from tools.parallel import (
+    ROOT_PARALLEL,
+    TREE_PARALLEL,
+    lazy_smp,
+    root_parallel_mcts,
+    tree_parallel_mcts,
+)
+from tools.pns import PNS_MAX_NODES, ProofNumberSearch
+from tools.shared_tt import SharedTranspositionTable
+from tools.transposition import (
+    TranspositionTable,
+    TTEntry,
+    EXACT,
+    LOWER,
+    UPPER,
+)
+from tools.zobrist import (
+    IDENTITY,
+    KEY_BITS,
+    KEY_MASK,
+    SIDE_KEY,
+    ZobristKeys,
+    symmetric_keys,
+    symmetric_side_key,
+    zobrist_keys,
+    zobrist_hash,
+)
 
 
 # --------------------------------------
@@ -38,6 +72,35 @@ CellPerso = Hex
 StatePerso = dict[CellPerso, Union[Player, int]]
 Neighbors = dict[CellPerso, list[CellPerso]]
 
+# score of a won game for RED, above any heuristic evaluation (the number of
+# legal moves, at most the 271 cells of a size 10 board): the searches stop on
+# a proven result
+WIN_SCORE = 1000
+
+# half width of the aspiration window of the principal variation search
+ASPIRATION_WINDOW = 2
+
+# symmetries of the boards (indexes of board_symmetries) which keep the rules:
+# all of them for Gopher, the mirror which keeps the forward directions for Dodo
+GOPHER_SYMMETRIES = tuple(range(NB_BOARD_SYMMETRIES))
+DODO_SYMMETRIES = (0, BOARD_MIRROR)
+
+# Gopher searches use the symmetries from positions of at most this number of
+# pawns, the image of the pawns by one of them being reachable: later, the
+# transpositions they find no longer pay for the cost of the symmetric keys
+SYMMETRY_PAWNS = 1
+
+# the searches analyse the regions of a position (tools/regions.py) when they
+# still have to search it at least this depth
+REGION_MIN_DEPTH = 3
+
+
+# --------------------------------------
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its time budget is over"""
+
 
 # --------------------------------------
 
@@ -61,7 +124,8 @@ class Game:
         if game not in [GOPHER_STR, DODO_STR]:
             raise ValueError("game must be GOPHER_STR or DODO_STR")
         
-        self.cache = {}
+        self._cache: TranspositionTable = None  # allocated on first use
+        self.ordering: MoveOrdering = MoveOrdering()
         self.game: str = game
         self.state: StatePerso = state
         self.player: Player = player
@@ -69,6 +133,120 @@ class Game:
         self.total_time: Time = total_time
         self.root: MCTSNode = root
 
+        # exact outcomes of positions (tools/endgame.py) and of the late Gopher
+        # positions split into independent regions (tools/regions.py), probed
+        # by the searches
+        self.endgame = None
+        self.regions = None
+
+        # search statistics and time limit
+        self.nodes: int = 0
+        self.depth_reached: int = 0
+        self.simulations: int = 0
+        self.simulations_per_second: float = 0.0
+        self.proven_win: Optional[bool] = None  # result of the proof search
+        self.proof_size: int = 0
+        self.nodes_per_second: float = 0.0
+        self._deadline: float = float("inf")
+
+        # Zobrist key of the state, updated by play and undo: the packed keys
+        # of its images by the symmetries once a search uses them
+        self.use_symmetries: bool = True
+        self._symmetries: tuple[int, ...] = IDENTITY
+        self._key_shifts: list[int] = [0]
+        self._key_bytes: int = KEY_BITS // 8
+        self._keys: ZobristKeys = zobrist_keys(hex_size)
+        self._side_key: int = SIDE_KEY
+        self._zobrist: int = zobrist_hash(self.state, player, hex_size)
+
+    @property
+    def cache(self) -> TranspositionTable:
+        """Transposition table of the alpha beta searches, only allocated by
+        the first search (the playout workers never use it)"""
+        if self._cache is None:
+            self._cache = TranspositionTable()
+        return self._cache
+
+    def cell_owner(self, cell: CellPerso) -> Player:
+        """Return the player on the cell, EMPTY if there is none"""
+        return self.state[cell]
+
+    @property
+    def zobrist(self) -> int:
+        """64 bits Zobrist key of the current state (cells and player to move)"""
+        return self._zobrist & KEY_MASK
+
+    def update_symmetries(self):
+        """Hash the states up to the symmetries of the board in the Gopher
+        openings of at most SYMMETRY_PAWNS pawns, while states equivalent by
+        symmetry can still be reached: a symmetry moves every pawn to an empty
+        cell or to a pawn of its colour. Dodo positions almost never stay
+        symmetric, their keys are plain."""
+        symmetries: tuple[int, ...] = IDENTITY
+        if self.use_symmetries and self.game == GOPHER_STR:
+            state: StatePerso = self.state
+            pawns = [(cell, play) for cell, play in state.items() if play != EMPTY]
+            tables = board_symmetries(self.hex_size)
+            for k in GOPHER_SYMMETRIES[1:] if len(pawns) <= SYMMETRY_PAWNS else ():
+                images: list[Player] = [state[tables[k][cell]] for cell, _ in pawns]
+                if all(image in (EMPTY, play) for image, (_, play) in zip(images, pawns)):
+                    symmetries = GOPHER_SYMMETRIES
+                    break
+        if symmetries == self._symmetries:
+            return
+        self._symmetries = symmetries
+        self._key_shifts = [KEY_BITS * j for j in range(len(symmetries))]
+        self._key_bytes = KEY_BITS // 8 * len(symmetries)
+        self._keys = symmetric_keys(self.hex_size, symmetries)
+        self._side_key = symmetric_side_key(symmetries)
+        self._zobrist = zobrist_hash(self.state, self.player, self.hex_size, symmetries)
+
+    def canonical_key(self) -> tuple[int, int]:
+        """Key of the state up to the symmetries: the smallest key of its
+        images, and the index in the symmetries of the image which has it"""
+        if len(self._key_shifts) == 1:
+            return self._zobrist, 0
+        # the 64 bits words of the packed keys, faster than shifts and masks
+        packed: bytes = self._zobrist.to_bytes(self._key_bytes, "little")
+        keys: list[int] = memoryview(packed).cast("Q").tolist()
+        key: int = min(keys)
+        return key, keys.index(key)
+
+    def image_action(self, action: Action, image: int, inverse: bool = False):
+        """Action in the image of the state by the symmetry of index image (as
+        given by canonical_key), the action of the state from the one of the
+        image if inverse"""
+        if not image or action is None:
+            return action
+        k: int = self._symmetries[image]
+        if inverse:
+            k = inverse_symmetry(k)
+        return map_action(action, board_symmetries(self.hex_size)[k])
+
+    def distinct_legals(self) -> list[Action]:
+        """Legal moves, only one of the moves which lead to states equivalent
+        by a symmetry of the current state"""
+        leg: list[Action] = self.legals()
+        if len(self._key_shifts) == 1 or len(leg) < 2:
+            return leg
+        zobrist: int = self._zobrist
+        key: int = zobrist & KEY_MASK
+        tables = board_symmetries(self.hex_size)
+        stabilizer: list[dict[Hex, Hex]] = [
+            tables[self._symmetries[j]]
+            for j, shift in enumerate(self._key_shifts)
+            if j and (zobrist >> shift) & KEY_MASK == key
+        ]
+        if not stabilizer:
+            return leg
+        res: list[Action] = []
+        seen: set[Action] = set()
+        for action in leg:
+            if action not in seen:
+                res.append(action)
+                seen.update(map_action(action, table) for table in stabilizer)
+        return res
+
     def plot(self):
         """Plot the current state of the game"""
         plt.figure(figsize=(10, 10))
@@ -138,6 +316,37 @@ class Game:
         """Heuristic evaluation based on the number of legals moves"""
         raise NotImplementedError
 
+    def winner(self) -> Player:
+        """Return the winner of a finished game"""
+        return RED if self.score() == WIN_SCORE else BLUE
+
+    def random_playout(self, moves: dict[Player, set] = None) -> Player:
+        """Play random moves until the end of the game, restore the state and
+        return the winner. The legal moves are computed once per move. The moves
+        played by each player are added to moves if given."""
+        stack: list[Action] = []
+        leg: list[Action] = self.legals()
+        while leg:
+            action: Action = random.choice(leg)
+            if moves is not None:
+                moves[self.player].add(action)
+            stack.append(action)
+            self.play(action)
+            leg = self.legals()
+
+        winner: Player = self.winner()
+        while stack:
+            self.undo(stack.pop())
+        return winner
+
+    def batch_playouts(self, nb: int) -> int:
+        """Play nb random games at once with NumPy, return the number of RED wins"""
+        if self.final():
+            return nb if self.winner() == RED else 0
+        return batch_rollout(self.game, self.hex_size).rollouts(
+            self.state, self.player, nb
+        )
+
     def strategy_random(self) -> Action:
         """Random strategy"""
         res: list[Action] = self.legals()
@@ -189,20 +398,78 @@ class Game:
     
     def strategy_alpha_beta_cache(self, max_depth=5) -> Action:
         """Alpha beta strategy with cache"""
+        self.cache.new_search()
+        self.ordering.new_search()
+        self.update_symmetries()
+        self.nodes = 0
         return self.alpha_beta_cache(max_depth, -float("inf"), float("inf"))[0]
-    
-    def alpha_beta_cache(self, depth: int, alpha: int, beta: int) -> tuple[Action, Score]:
-        """Alpha beta algorithm with caching of alpha and beta values"""
-        state_key = (self.player, frozenset(self.state.items()), depth)  # Create a unique key for the current state with depth
-
-        if state_key in self.cache:
-            cached_alpha, cached_beta, cached_result = self.cache[state_key]
-            if cached_alpha >= beta:
-                return cached_result  # Beta cut-off
-            if cached_beta <= alpha:
-                return cached_result  # Alpha cut-off
-            alpha = max(alpha, cached_alpha)
-            beta = min(beta, cached_beta)
+
+    def _tt_probe(
+        self, depth: int, alpha: float, beta: float, ply: int
+    ) -> tuple[Optional[tuple[Action, Score]], int, int, Action, float, float]:
+        """Count a node of the alpha beta searches, probe the transposition
+        table and the known winners: return the result of the node if they
+        give it (None otherwise), the key and image of the state, the move of
+        the table and the window narrowed by its bounds"""
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self._deadline:
+            raise SearchTimeout
+
+        key, image = self.canonical_key()
+        entry: TTEntry = self.cache.probe(key)
+        cached_action: Action = None
+        if entry is not None:
+            cached_depth, flag, cached_score, cached_action = entry
+            if image:
+                cached_action = self.image_action(cached_action, image, inverse=True)
+            if cached_depth >= depth:
+                if flag == LOWER:
+                    alpha = max(alpha, cached_score)
+                elif flag == UPPER:
+                    beta = min(beta, cached_score)
+                if flag == EXACT or beta <= alpha:
+                    known = (cached_action, cached_score)
+                    return known, key, image, cached_action, alpha, beta
+
+        # after the table, whose cutoffs are cheaper than the probes
+        if ply:
+            winner: Player = self.known_winner(depth)
+            if winner is not None:
+                known = (None, WIN_SCORE if winner == RED else -WIN_SCORE)
+                return known, key, image, cached_action, alpha, beta
+        return None, key, image, cached_action, alpha, beta
+
+    def _tt_store(
+        self,
+        key: int,
+        image: int,
+        depth: int,
+        alpha: float,
+        beta: float,
+        action: Action,
+        score: Score,
+    ):
+        """Store the result of the search of the window [alpha, beta] of the
+        state of key, its move in the frame of the canonical image"""
+        if score <= alpha:
+            flag = UPPER
+        elif score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if image:
+            action = self.image_action(action, image)
+        self.cache.store(key, depth, flag, score, action)
+
+    def alpha_beta_cache(
+        self, depth: int, alpha: int, beta: int, ply: int = 0
+    ) -> tuple[Action, Score]:
+        """Alpha beta algorithm with a transposition table at every ply"""
+        known, key, image, cached_action, alpha, beta = self._tt_probe(
+            depth, alpha, beta, ply
+        )
+        if known is not None:
+            return known
 
         leg: list[Action] = self.legals()
 
@@ -212,40 +479,293 @@ class Game:
         if depth == 0:
             return None, self.heuristic_evaluation(leg)
 
+        # best move of a previous search first, then killers and history
+        leg = self.ordering.order(leg, ply, cached_action, self.player)
+
+        # window actually searched, to know the kind of the result
+        alpha_searched, beta_searched = alpha, beta
+
         if self.player == RED:
             best_score: float = -float("inf")
             best_action: Action = None
             for action in leg:
                 self.play(action)
-                _, score = self.alpha_beta(depth - 1, alpha, beta)
-                self.undo(action)
+                try:
+                    _, score = self.alpha_beta_cache(depth - 1, alpha, beta, ply + 1)
+                finally:
+                    self.undo(action)
                 if score > best_score:
                     best_score = score
                     best_action = action
                 alpha = max(alpha, best_score)
                 if beta <= alpha:
+                    self.ordering.cutoff(action, ply, depth, cached_action, RED)
                     break
-            result = (best_action, best_score)
         else:
             best_score: float = float("inf")
             best_action: Action = None
             for action in leg:
                 self.play(action)
-                _, score = self.alpha_beta(depth - 1, alpha, beta)
-                self.undo(action)
+                try:
+                    _, score = self.alpha_beta_cache(depth - 1, alpha, beta, ply + 1)
+                finally:
+                    self.undo(action)
                 if score < best_score:
                     best_score = score
                     best_action = action
                 beta = min(beta, best_score)
                 if beta <= alpha:
+                    self.ordering.cutoff(action, ply, depth, cached_action, BLUE)
                     break
-            result = (best_action, best_score)
 
-        self.cache[state_key] = (alpha, beta, result)  # Cache the result with alpha and beta values
-        return result
+        self._tt_store(
+            key, image, depth, alpha_searched, beta_searched, best_action, best_score
+        )
+        return best_action, best_score
+
+    def strategy_iterative_deepening(
+        self,
+        time_budget: float,
+        max_depth: int = 64,
+        first_depth: int = 1,
+        new_search: bool = True,
+    ) -> Action:
+        """Alpha beta with cache at depth 1, 2, 3... until the time budget
+        (in seconds) is over, return the move of the deepest complete search"""
+        return self._iterative_deepening(
+            time_budget,
+            max_depth,
+            lambda depth, _: self.alpha_beta_cache(depth, -float("inf"), float("inf")),
+            first_depth,
+            new_search,
+        )
+
+    def strategy_lazy_smp(
+        self,
+        time_budget: float,
+        max_depth: int = 64,
+        workers: int = 1,
+        new_search: bool = True,
+    ) -> Action:
+        """Iterative deepening on workers processes sharing the transposition
+        table (Lazy SMP), return the move of the deepest complete search"""
+        if not isinstance(self._cache, SharedTranspositionTable):
+            self._cache = SharedTranspositionTable(self.hex_size)
+        endgame_action: Action = self.endgame_move()
+        if endgame_action is not None:
+            return endgame_action
+        if workers <= 1 or len(self.legals()) == 1:
+            return self.strategy_iterative_deepening(
+                time_budget, max_depth, new_search=new_search
+            )
+        return lazy_smp(self, time_budget, max_depth, workers, new_search)
+
+    def known_winner(self, depth: int = REGION_MIN_DEPTH) -> Player:
+        """Winner given by the endgame table or by the region analysis, None if
+        neither knows the position. The regions are only analysed when the
+        depth left to search is at least REGION_MIN_DEPTH, the analysis
+        costing more than a node."""
+        winner: Player = None
+        if self.endgame is not None:
+            winner = self.endgame.winner(self)
+        if winner is None and self.regions is not None and depth >= REGION_MIN_DEPTH:
+            winner = self.regions.winner(self)
+        return winner
+
+    def endgame_move(self) -> Action:
+        """Move given by the endgame table or by the region analysis, None if
+        neither knows the position"""
+        action: Action = None
+        if self.endgame is not None:
+            action = self.endgame.best_move(self)
+        if action is None and self.regions is not None:
+            action = self.regions.best_move(self)
+        if action is not None:
+            self.nodes = 0
+            self.depth_reached = 0
+        return action
+
+    def strategy_pns(
+        self, max_nodes: int = PNS_MAX_NODES, time_budget: float = float("inf")
+    ) -> Action:
+        """Proof-number search (df-pn) of at most max_nodes nodes or time_budget
+        seconds, return the winning move if the position is proven, the most
+        promising one otherwise. proven_win tells if the player to move wins
+        (None if the search could not tell)."""
+        self.update_symmetries()
+        search = ProofNumberSearch(self, max_nodes, time.perf_counter() + time_budget)
+        self.proven_win = search.solve()
+        self.nodes = search.nodes
+        self.nodes_per_second = search.nodes_per_second()
+        self.proof_size = search.proof_size() if self.proven_win is not None else 0
+        return search.best_move()
+
+    def strategy_pvs(self, time_budget: float, max_depth: int = 64) -> Action:
+        """Principal variation search, iteratively deepened, with an aspiration
+        window around the score of the previous iteration"""
+        return self._iterative_deepening(time_budget, max_depth, self.aspiration)
+
+    def strategy_mtdf(self, time_budget: float, max_depth: int = 64) -> Action:
+        """MTD(f), iteratively deepened, from the score of the previous iteration"""
+        return self._iterative_deepening(time_budget, max_depth, self.mtdf)
+
+    def _iterative_deepening(
+        self,
+        time_budget: float,
+        max_depth: int,
+        search: Callable[[int, Score], tuple[Action, Score]],
+        first_depth: int = 1,
+        new_search: bool = True,
+    ) -> Action:
+        """Call search(depth, previous score) at depth first_depth, first_depth
+        + 1... until the time budget is over, return the move of the deepest
+        complete search. A search which is not new (pondering) leaves the age
+        of the table and the move ordering to the search of the next move."""
+        leg: list[Action] = self.legals()
+        if len(leg) == 1:
+            return leg[0]
+        endgame_action: Action = self.endgame_move()
+        if endgame_action is not None:
+            return endgame_action
+
+        if new_search:
+            self.cache.new_search()
+            self.ordering.new_search()
+        self.update_symmetries()
+        self.nodes = 0
+        self.depth_reached = 0
+        self._deadline = time.perf_counter() + time_budget
+        best_action: Action = leg[0]
+        score: Score = None
+        try:
+            for depth in range(first_depth, max_depth + 1):
+                best_action, score = search(depth, score)
+                self.depth_reached = depth
+                if abs(score) == WIN_SCORE:
+                    break  # the result of the game is known
+        except SearchTimeout:
+            pass
+        finally:
+            self._deadline = float("inf")
+        return best_action
+
+    def aspiration(self, depth: int, guess: Score) -> tuple[Action, Score]:
+        """Principal variation search in a window around the guess, widened
+        on the failing side when the score falls outside of it"""
+        if guess is None:
+            return self.pvs(depth, -float("inf"), float("inf"))
+
+        alpha: float = guess - ASPIRATION_WINDOW
+        beta: float = guess + ASPIRATION_WINDOW
+        while True:
+            action, score = self.pvs(depth, alpha, beta)
+            if score <= alpha:
+                alpha = -float("inf")
+            elif score >= beta:
+                beta = float("inf")
+            else:
+                return action, score
+
+    def mtdf(self, depth: int, guess: Score) -> tuple[Action, Score]:
+        """MTD(f): null window searches converging on the score"""
+        score: float = 0 if guess is None else guess
+        lower: float = -float("inf")
+        upper: float = float("inf")
+        action: Action = None
+        while lower < upper:
+            bound: float = score + 1 if score == lower else score
+            searched_action, score = self.alpha_beta_cache(depth, bound - 1, bound)
+            if score < bound:
+                upper = score
+            else:
+                lower = score
+            # only a failure on the side of the player gives a proven move
+            if (score >= bound) == (self.player == RED):
+                action = searched_action
+
+        # no such failure: the move is in the table
+        if action is None:
+            key, image = self.canonical_key()
+            entry: TTEntry = self.cache.probe(key)
+            if entry is not None:
+                action = self.image_action(entry[3], image, inverse=True)
+            else:
+                action = self.legals()[0]
+        return action, score
+
+    def pvs(
+        self, depth: int, alpha: float, beta: float, ply: int = 0
+    ) -> tuple[Action, Score]:
+        """Principal variation search: the first move with the full window,
+        the others with a null window, searched again if they are better"""
+        known, key, image, cached_action, alpha, beta = self._tt_probe(
+            depth, alpha, beta, ply
+        )
+        if known is not None:
+            return known
+
+        leg: list[Action] = self.legals()
 
-    def strategy_mc(self, nb_iter: int) -> Action:
-        """Monte Carlo strategy"""
+        if len(leg) == 0:
+            return None, self.score()
+
+        if depth == 0:
+            return None, self.heuristic_evaluation(leg)
+
+        leg = self.ordering.order(leg, ply, cached_action, self.player)
+        alpha_searched, beta_searched = alpha, beta
+
+        if self.player == RED:
+            best_score: float = -float("inf")
+            best_action: Action = None
+            for i, action in enumerate(leg):
+                self.play(action)
+                try:
+                    if i == 0:
+                        _, score = self.pvs(depth - 1, alpha, beta, ply + 1)
+                    else:
+                        _, score = self.pvs(depth - 1, alpha, alpha + 1, ply + 1)
+                        if alpha < score < beta:
+                            _, score = self.pvs(depth - 1, score, beta, ply + 1)
+                finally:
+                    self.undo(action)
+                if score > best_score:
+                    best_score = score
+                    best_action = action
+                alpha = max(alpha, best_score)
+                if beta <= alpha:
+                    self.ordering.cutoff(action, ply, depth, cached_action, RED)
+                    break
+        else:
+            best_score: float = float("inf")
+            best_action: Action = None
+            for i, action in enumerate(leg):
+                self.play(action)
+                try:
+                    if i == 0:
+                        _, score = self.pvs(depth - 1, alpha, beta, ply + 1)
+                    else:
+                        _, score = self.pvs(depth - 1, beta - 1, beta, ply + 1)
+                        if alpha < score < beta:
+                            _, score = self.pvs(depth - 1, alpha, score, ply + 1)
+                finally:
+                    self.undo(action)
+                if score < best_score:
+                    best_score = score
+                    best_action = action
+                beta = min(beta, best_score)
+                if beta <= alpha:
+                    self.ordering.cutoff(action, ply, depth, cached_action, BLUE)
+                    break
+
+        self._tt_store(
+            key, image, depth, alpha_searched, beta_searched, best_action, best_score
+        )
+        return best_action, best_score
+
+    def strategy_mc(self, nb_iter: int, batch: bool = False) -> Action:
+        """Monte Carlo strategy, the playouts of each move played at once with
+        NumPy if batch is True"""
         legals: list[Action] = self.legals()
 
         if len(legals) == 1:
@@ -253,28 +773,24 @@ class Game:
 
         best_value: int = 0
         best_action: Action = None
-        stack: deque = deque()
 
         for action in legals:
             gain: float = 0
             victoire_rouge: int = 0
             victoire_bleu: int = 0
-            stack.append(action)
             self.play(action)
 
-            for _ in range(nb_iter // len(legals) + 1):
-                while not self.final():
-                    tmp_action: Action = self.strategy_random()
-                    stack.append(tmp_action)
-                    self.play(tmp_action)
-                if self.score() == 100:
-                    victoire_rouge += 1
-                elif self.score() == -100:
-                    victoire_bleu += 1
-                while len(stack) > 1:
-                    self.undo(stack.pop())
+            if batch:
+                victoire_rouge = self.batch_playouts(nb_iter // len(legals) + 1)
+                victoire_bleu = nb_iter // len(legals) + 1 - victoire_rouge
+            else:
+                for _ in range(nb_iter // len(legals) + 1):
+                    if self.random_playout() == RED:
+                        victoire_rouge += 1
+                    else:
+                        victoire_bleu += 1
 
-            self.undo(stack.pop())
+            self.undo(action)
             if self.player == RED:
                 gain = victoire_rouge / nb_iter
             else:
@@ -284,12 +800,74 @@ class Game:
                 best_action = action
         return best_action
 
-    def strategy_mcts(self, nb_simu: int, root: MCTSNode = None) -> Action:
-        """Monte Carlo Tree Search strategy"""
+    def strategy_mcts(
+        self,
+        nb_simu: int,
+        root: MCTSNode = None,
+        batch_size: int = 1,
+        workers: int = 1,
+        parallel: str = ROOT_PARALLEL,
+        time_budget: float = float("inf"),
+        rave: float = 0,
+    ) -> Action:
+        """Monte Carlo Tree Search strategy, each leaf evaluated with batch_size
+        playouts, on workers processes with root or tree parallelism. Stop after
+        nb_simu simulations or time_budget seconds. A new tree uses RAVE with
+        the equivalence parameter rave if it is not 0."""
+        start: float = time.perf_counter()
+        deadline: float = start + time_budget
+        self.update_symmetries()
+        if not root:
+            root: MCTSNode = MCTSNode(self.distinct_legals(), self.player, rave=rave)
+        visits: int = root.n()
+        worker_simulations: int = 0  # simulations of the trees of the workers
+        if workers > 1 and parallel == TREE_PARALLEL:
+            child = tree_parallel_mcts(
+                self, root, nb_simu, workers, batch_size, deadline
+            )
+        elif workers > 1:
+            child, worker_simulations = root_parallel_mcts(
+                self, root, nb_simu, workers, batch_size, deadline
+            )
+        else:
+            child = root.best_action(self, nb_simu, batch_size, deadline)
+        self._simulation_stats(
+            root.n() - visits + worker_simulations, time.perf_counter() - start
+        )
+        return child.parent_action, child
+
+    def _simulation_stats(self, simulations: int, elapsed: float):
+        """Record the number of simulations of a search and their rate"""
+        self.simulations = simulations
+        self.simulations_per_second = simulations / elapsed if elapsed > 0 else 0.0
+
+    def strategy_mcts_pool(
+        self,
+        nb_simu: int,
+        root: PoolNode = None,
+        batch_size: int = 1,
+        capacity: int = POOL_SIZE,
+        time_budget: float = float("inf"),
+    ) -> Action:
+        """Monte Carlo Tree Search strategy on a pool of at most capacity
+        nodes, the subtree of a reused root being first copied in a new pool.
+        Stop after nb_simu simulations or time_budget seconds."""
+        start: float = time.perf_counter()
         if not root:
-            root: MCTSNode = MCTSNode(self.legals(), self.player)
-        root = root.best_action(self, nb_simu=nb_simu)
-        return root.parent_action, root
+            # the root and its children must fit in the pool
+            if capacity < len(self.legals()) + 1:
+                raise ValueError(
+                    f"a pool of {capacity} nodes cannot hold the root and its "
+                    f"{len(self.legals())} children"
+                )
+            root = PoolNode(NodePool(self.player, capacity))
+            root.pool.new_node(NO_NODE, None)
+        elif root.index != 0:
+            root = PoolNode(root.pool.subtree(root.index))
+        visits: int = root.n()
+        child = root.best_action(self, nb_simu, batch_size, start + time_budget)
+        self._simulation_stats(root.n() - visits, time.perf_counter() - start)
+        return child.parent_action, child
 
 
 Environment = Game
@@ -313,6 +891,11 @@ class GameGopher(Game):
         # initialisation des pions
         self.red_pawns: StatePerso = {}
         self.blue_pawns: StatePerso = {}
+        for hexagon, play in state.items():
+            if play == RED:
+                self.red_pawns[hexagon] = RED
+            elif play == BLUE:
+                self.blue_pawns[hexagon] = BLUE
 
         # initilisations de tous les voisins
         neighbor_gopher = [
@@ -334,43 +917,55 @@ class GameGopher(Game):
                 if neighbor in state:
                     self.neighbors[hexagon].append(neighbor)
 
+        # number of adjacent pawns of each player, for every cell
+        self.adjacent: dict[Player, dict[CellPerso, int]] = {
+            RED: dict.fromkeys(state, 0),
+            BLUE: dict.fromkeys(state, 0),
+        }
+        for hexagon, play in state.items():
+            if play in (RED, BLUE):
+                for neighbor in self.neighbors[hexagon]:
+                    self.adjacent[play][neighbor] += 1
+
+        # legal cells of each player, updated by play and undo
+        self.legal_cells: dict[Player, set[CellPerso]] = {RED: set(), BLUE: set()}
+        for hexagon in state:
+            self._update_legal(hexagon)
+
+    def _update_legal(self, cell: CellPerso):
+        """Update the legality of a cell for both players"""
+        red: int = self.adjacent[RED][cell]
+        blue: int = self.adjacent[BLUE][cell]
+        if self.state[cell] == EMPTY and red == 0 and blue == 1:
+            self.legal_cells[RED].add(cell)
+        else:
+            self.legal_cells[RED].discard(cell)
+        if self.state[cell] == EMPTY and blue == 0 and red == 1:
+            self.legal_cells[BLUE].add(cell)
+        else:
+            self.legal_cells[BLUE].discard(cell)
+
     def legals(self) -> list[ActionGopher]:
         """Return the legal moves for the current player"""
-        res: list[ActionGopher] = []
-
         # first move can be anywhere
         if len(self.red_pawns) == 0 and len(self.blue_pawns) == 0:
             # if the board is empty, we place the first pawn in the center
-            res.append(axial_to_cube(DoubledCoord(0, self.hex_size - 1)))
-
-        # O(nb_paws) = O(nb_paws)
-        for hexagon, _ in (
-            self.red_pawns.items() if self.player == BLUE else self.blue_pawns.items()
-        ):
-            # O(6) = O(1)
-            moves: list[CellPerso] = []
-
-            for neighbor in self.neighbors[hexagon]:
-                if self.state[neighbor] == EMPTY:
-                    moves.append(neighbor)
-            # O(6*6) = O(1)
-            for move in moves:
-                enemy: int = 0
-                friendly: int = 0
-                for n in self.neighbors[move]:
-                    if self.state[n] == self.player:
-                        friendly += 1
-                    elif self.state[n] == 3 - self.player:
-                        enemy += 1
-                if enemy == 1 and friendly == 0:
-                    res.append(move)
+            return [axial_to_cube(DoubledCoord(0, self.hex_size - 1))]
 
-        return res
+        # O(legal_moves), the set is kept up to date by play and undo
+        return list(self.legal_cells[self.player])
+
+    def final(self) -> bool:
+        """Return True if the game is over"""
+        if len(self.red_pawns) == 0 and len(self.blue_pawns) == 0:
+            return False
+        return not self.legal_cells[self.player]
 
     def play(self, action: ActionGopher):
         """Play the move"""
         # update party state
         self.state[action] = self.player
+        self._zobrist ^= self._keys[action][self.player] ^ self._side_key
 
         # update pawns
         if self.player == RED:
@@ -378,6 +973,14 @@ class GameGopher(Game):
         else:
             self.blue_pawns[action] = self.player
 
+        # update the legal cells around the move: O(6)
+        adjacent: dict[CellPerso, int] = self.adjacent[self.player]
+        self.legal_cells[RED].discard(action)
+        self.legal_cells[BLUE].discard(action)
+        for neighbor in self.neighbors[action]:
+            adjacent[neighbor] += 1
+            self._update_legal(neighbor)
+
         self.player = 3 - self.player  # changement de joueur
 
     def undo(self, action: ActionGopher):
@@ -386,6 +989,7 @@ class GameGopher(Game):
 
         # update party state
         self.state[action] = EMPTY
+        self._zobrist ^= self._keys[action][self.player] ^ self._side_key
 
         # update pawns
         if self.player == RED:
@@ -393,9 +997,16 @@ class GameGopher(Game):
         else:
             del self.blue_pawns[action]
 
+        # update the legal cells around the move: O(6)
+        adjacent: dict[CellPerso, int] = self.adjacent[self.player]
+        for neighbor in self.neighbors[action]:
+            adjacent[neighbor] -= 1
+            self._update_legal(neighbor)
+        self._update_legal(action)
+
     def score(self) -> Score:
         """Return the score of the game"""
-        return -100 if self.player == RED else 100
+        return -WIN_SCORE if self.player == RED else WIN_SCORE
 
     def heuristic_evaluation(self, leg) -> Score:
         """Heuristic evaluation based on the number of legals moves"""
@@ -481,6 +1092,11 @@ class GameDodo(Game):
         # update party state
         self.state[action[0]] = EMPTY
         self.state[action[1]] = self.player
+        self._zobrist ^= (
+            self._keys[action[0]][self.player]
+            ^ self._keys[action[1]][self.player]
+            ^ self._side_key
+        )
 
         # update pawns
         if self.player == RED:
@@ -499,6 +1115,11 @@ class GameDodo(Game):
         # update party state
         self.state[action[0]] = self.player
         self.state[action[1]] = EMPTY
+        self._zobrist ^= (
+            self._keys[action[0]][self.player]
+            ^ self._keys[action[1]][self.player]
+            ^ self._side_key
+        )
 
         # update pawns
         if self.player == RED:
@@ -510,7 +1131,7 @@ class GameDodo(Game):
 
     def score(self) -> Score:
         """Return the score of the game"""
-        return 100 if self.player == RED else -100
+        return WIN_SCORE if self.player == RED else -WIN_SCORE
 
     def heuristic_evaluation(self, leg) -> Score:
         """Heuristic evaluation based on the number of legals moves"""
@@ -523,6 +1144,13 @@ class GameDodo(Game):
 # --------------------------------------
 
 
+def map_action(action: Action, table: dict[Hex, Hex]) -> Action:
+    """Image of an action by a permutation of the cells"""
+    if isinstance(action, Hex):
+        return table[action]
+    return table[action[0]], table[action[1]]
+
+
 def new_dodo(h: int) -> StatePerso:
     """Return a new Dodo grid of size h x h"""
     h = h - 1  # pour avoir un plateau de taille h
@@ -3,7 +3,9 @@
 from __future__ import division
 from __future__ import print_function
 import collections
+from functools import lru_cache
 import math
+from client.gndclient import RED, BLUE
 
 
 Point = collections.namedtuple("Point", ["x", "y"])
@@ -265,6 +267,59 @@ def polygon_corners(layout, h):
     return corners
 
 
+# Symmetries of the game boards, in the axial coordinates of the games: the
+# neighbours of a cell are at (q, r) +- (1, 0), (0, 1) and (1, 1)
+
+NB_BOARD_SYMMETRIES = 12
+BOARD_MIRROR = 6  # (q, r) -> (r, q), keeps the forward directions of Dodo
+
+# neighbours of a cell in Gopher, and forward directions of each player in
+# Dodo, as (q, r) offsets
+GOPHER_DIRECTIONS = [(-1, 0), (-1, -1), (0, -1), (0, 1), (1, 1), (1, 0)]
+DODO_FORWARD = {
+    RED: [(0, 1), (1, 1), (1, 0)],
+    BLUE: [(-1, 0), (-1, -1), (0, -1)],
+}
+
+
+def board_rotate(a):
+    """Rotate a cell by 60 degrees around the centre of the board"""
+    return Hex(a.q - a.r, a.q, a.r - 2 * a.q)
+
+
+def board_reflect(a):
+    """Reflect a cell across the axis q = r of the board"""
+    return Hex(a.r, a.q, a.s)
+
+
+@lru_cache(maxsize=None)
+def board_symmetries(hex_size):
+    """Permutation of the cells of a board of size hex_size by each of its 12
+    symmetries: the rotations by k * 60 degrees for k < 6 (0 is the identity),
+    then the reflection after the rotation by (k - 6) * 60 degrees"""
+    h = hex_size - 1
+    cells = [
+        Hex(q, r, -q - r)
+        for r in range(h, -h - 1, -1)
+        for q in range(max(-h, r - h), min(h, r + h) + 1)
+    ]
+    tables = []
+    for k in range(NB_BOARD_SYMMETRIES):
+        table = {}
+        for cell in cells:
+            image = cell
+            for _ in range(k % 6):
+                image = board_rotate(image)
+            table[cell] = board_reflect(image) if k >= 6 else image
+        tables.append(table)
+    return tables
+
+
+def inverse_symmetry(k):
+    """Index of the inverse of the symmetry k of board_symmetries"""
+    return (6 - k) % 6 if k < 6 else k
+
+
 # Tests
 
 
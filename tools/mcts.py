@@ -1,32 +1,79 @@
 """Monte Carlo Tree Search"""
 
-from collections import defaultdict, deque
+from collections import deque
+import math
+import time
+from typing import Callable
 import numpy as np
 
 from client.gndclient import (
     Action,
     Player,
+    RED,
     BLUE,
 )
 
+# below this number of children, the UCB values are computed in a Python loop,
+# faster than NumPy on small arrays
+VECTORIZE_MIN_CHILDREN = 32
+
+# simulations between two reads of the clock of a time bounded search
+CHECK_EVERY = 16
+
 
 class MCTSNode:
-    """Node of the Monte Carlo Tree Search"""
+    """Node of the Monte Carlo Tree Search
+
+    The statistics are counted for associated_player, the player of the root.
+    A node whose result is known (MCTS-Solver) is proven: proven is the winner
+    of its position, whatever the moves. Proven nodes are not selected anymore.
+
+    With rave = k > 0 (RAVE equivalence parameter), the node also keeps the
+    all moves as first statistics of its children: the results of the
+    simulations in which the move of the child was played later by the same
+    player. They weigh beta = sqrt(k / (3 n + k)) in the value of a child of n
+    visits, half of it when n = k / 3.
+    """
 
     def __init__(
-        self, leg: list[Action], player: Player, parent=None, parent_action=None
+        self,
+        leg: list[Action],
+        player: Player,
+        parent=None,
+        parent_action=None,
+        to_move: Player = None,
+        rave: float = 0,
     ):
         self.parent: MCTSNode = parent
         self.associated_player: Player = player
+        self.player_to_move: Player = player if to_move is None else to_move
+        self.proven: Player = None
         self.parent_action: Action = parent_action
         self.children: list[MCTSNode] = []
         self._number_of_visits: int = 0
-        self._results: defaultdict[int] = defaultdict(int)
         self._wins: int = 0
         self._loses: int = 0
         self._untried_actions: list[Action] = None
         self._untried_actions = leg
 
+        # statistics of the children, child i of children being at index i
+        self._slot: int = 0
+        self._child_n: np.ndarray = np.zeros(len(leg))
+        self._child_q: np.ndarray = np.zeros(len(leg))
+        self._child_penalty: np.ndarray = np.zeros(len(leg))  # -inf once proven
+        self._log_n: float = 0.0
+        self._log_n_visits: int = 0  # visits when _log_n was computed
+
+        # AMAF statistics of the children, only with RAVE
+        self.rave: float = rave
+        self._slots: dict[Action, int] = None
+        self._child_amaf_n: np.ndarray = None
+        self._child_amaf_q: np.ndarray = None
+        if rave:
+            self._slots = {}
+            self._child_amaf_n = np.zeros(len(leg))
+            self._child_amaf_q = np.zeros(len(leg))
+
     def q(self) -> int:
         """Return the number of wins of the node"""
         return self._wins - self._loses
@@ -35,62 +82,202 @@ class MCTSNode:
         """Return the number of visits of the node"""
         return self._number_of_visits
 
-    def expand(self, env):
-        """Expand the node with a new child node"""
-        action: Action = self._untried_actions.pop()
+    def expand(self, env, action: Action = None):
+        """Expand the node with a new child node, for the given action or an
+        untried one"""
+        if action is None:
+            action = self._untried_actions.pop()
+        else:
+            self._untried_actions.remove(action)
         env.play(action)
-        leg: list[Action] = env.legals()
+        leg: list[Action] = env.distinct_legals()
         child_node = MCTSNode(
-            leg, self.associated_player, parent=self, parent_action=action
+            leg,
+            self.associated_player,
+            parent=self,
+            parent_action=action,
+            to_move=env.player,
+            rave=self.rave,
         )
+        winner: Player = None if leg else env.winner()
+        if winner is None:
+            winner = env.known_winner()
         env.undo(action)
+        child_node._slot = len(self.children)
+        if self.rave:
+            self._slots[action] = child_node._slot
         self.children.append(child_node)
+        if winner is not None:
+            child_node.prove(winner)
         return child_node
 
+    def prove(self, winner: Player):
+        """Mark the node as won by the winner and the ancestors whose result
+        follows: won by their player to move if one child is, lost if all the
+        children are lost"""
+        node: MCTSNode = self
+        while True:
+            node.proven = winner
+            parent: MCTSNode = node.parent
+            if parent is None or parent.proven is not None:
+                return
+            parent._child_penalty[node._slot] = -math.inf
+            if winner != parent.player_to_move and (
+                not parent.is_fully_expanded()
+                or any(child.proven is None for child in parent.children)
+            ):
+                return
+            node = parent
+
+    def child(self, env, action: Action):
+        """Return the child of the action, expanded if needed"""
+        for child in self.children:
+            if child.parent_action == action:
+                return child
+        return self.expand(env, action)
+
     def is_terminal_node(self, env) -> bool:
         """Check if the node is a terminal node"""
         return env.final()
 
-    def rollout(self, env) -> int:
-        """Simulate a game from the node"""
-        stack: deque = deque()
-        while not env.final():
-            action: Action = env.strategy_random()
-            stack.append(action)
-            env.play(action)
-
-        score: int = env.score()
-        while len(stack) > 0:
-            env.undo(stack.pop())
-        return score
-
-    def backpropagate(self, result: int):
-        """Update the node with the result of the simulation"""
-        self._number_of_visits += 1.0
-        if self.associated_player == BLUE:
-            if result == -100:
-                self._wins += 1
-            else:
-                self._loses += 1
-        else:
-            if result == 100:
-                self._wins += 1
-            else:
-                self._loses += 1
+    def rollout(self, env, batch_size: int = 1, moves: dict = None) -> int:
+        """Simulate batch_size games from the node, return the number of RED wins.
+        The moves of a single game are added to moves if given."""
+        if batch_size > 1:
+            return env.batch_playouts(batch_size)
+        return 1 if env.random_playout(moves) == RED else 0
+
+    def discard(self, keep=None):
+        """Break the links of the subtree of the node, except the subtree of
+        keep, so that it is freed at once"""
+        stack: list[MCTSNode] = [self]
+        while stack:
+            node = stack.pop()
+            node.parent = None
+            stack.extend(child for child in node.children if child is not keep)
+            node.children = []
+
+    def remove_children(self, keep: Callable):
+        """Remove the children for which keep is False with their subtree, their
+        moves becoming untried again"""
+        kept: list[MCTSNode] = [child for child in self.children if keep(child)]
+        if len(kept) == len(self.children):
+            return
+        slots: list[int] = [child._slot for child in kept]
+        for array in (self._child_n, self._child_q, self._child_penalty):
+            array[: len(kept)] = array[slots]
+            array[len(kept) :] = 0
+        if self.rave:
+            for array in (self._child_amaf_n, self._child_amaf_q):
+                array[: len(kept)] = array[slots]
+                array[len(kept) :] = 0
+            self._slots = {child.parent_action: i for i, child in enumerate(kept)}
+        for child in self.children:
+            if not keep(child):
+                self._untried_actions.append(child.parent_action)
+                child.discard()
+        for i, child in enumerate(kept):
+            child._slot = i
+        self.children = kept
+
+    def add_results(self, visits: int, wins: int, loses: int):
+        """Add visits, wins and loses to the node (not to its ancestors)"""
+        self._number_of_visits += visits
+        self._wins += wins
+        self._loses += loses
         if self.parent:
-            self.parent.backpropagate(result)
+            self.parent._child_n[self._slot] += visits
+            self.parent._child_q[self._slot] += wins - loses
+
+    def backpropagate(self, red_wins: int, nb: int = 1, moves: dict = None):
+        """Update the node and its ancestors with the results of nb simulations,
+        and their AMAF statistics with the moves played from the node"""
+        wins: int = nb - red_wins if self.associated_player == BLUE else red_wins
+        node: MCTSNode = self
+        while node:
+            node.add_results(nb, wins, nb - wins)
+            if moves is not None:
+                node.add_amaf(moves[node.player_to_move], nb, 2 * wins - nb)
+                if node.parent:
+                    moves[node.parent.player_to_move].add(node.parent_action)
+            node = node.parent
+
+    def add_amaf(self, played: set, nb: int, q: int):
+        """Add nb visits and q to the AMAF statistics of the children whose move
+        was played"""
+        slots: dict[Action, int] = self._slots
+        indexes: list[int] = [slots[action] for action in played if action in slots]
+        if indexes:
+            self._child_amaf_n[indexes] += nb
+            self._child_amaf_q[indexes] += q
+
+    def add_virtual_loss(self, nb: int):
+        """Count nb visits lost from the node up to the root, so that the
+        other workers walking the tree choose other branches (nb < 0 to remove
+        them)"""
+        node: MCTSNode = self
+        while node:
+            node.add_results(nb, 0, nb)
+            node = node.parent
 
     def is_fully_expanded(self) -> bool:
         """ "Check if the node is fully expanded"""
         return len(self._untried_actions) == 0
 
+    def log_n(self) -> float:
+        """Return log of the number of visits, computed once per visit count"""
+        if self._log_n_visits != self._number_of_visits:
+            self._log_n = math.log(self._number_of_visits)
+            self._log_n_visits = self._number_of_visits
+        return self._log_n
+
     def best_child(self, c_param=np.sqrt(2)):
-        """Return the best child of the node"""
-        choices_weights = [
-            (c.q() / c.n()) + c_param * np.sqrt((np.log(self.n()) / c.n()))
-            for c in self.children
-        ]
-        return self.children[np.argmax(choices_weights)]
+        """Return the child with the best UCB value"""
+        nb: int = len(self.children)
+        log_n: float = self.log_n()
+        if self.rave:
+            return self.children[self._best_rave_child(nb, log_n, c_param)]
+        if nb < VECTORIZE_MIN_CHILDREN:
+            best: int = 0
+            best_value: float = -math.inf
+            for i, (q, n, penalty) in enumerate(
+                zip(
+                    self._child_q[:nb].tolist(),
+                    self._child_n[:nb].tolist(),
+                    self._child_penalty[:nb].tolist(),
+                )
+            ):
+                value: float = q / n + c_param * math.sqrt(log_n / n) + penalty
+                if value > best_value:
+                    best, best_value = i, value
+            return self.children[best]
+        n: np.ndarray = self._child_n[:nb]
+        values: np.ndarray = self._child_q[:nb] / n + c_param * np.sqrt(log_n / n)
+        values += self._child_penalty[:nb]
+        return self.children[int(np.argmax(values))]
+
+    def _best_rave_child(self, nb: int, log_n: float, c_param: float) -> int:
+        """Index of the child with the best UCB value, its mean being blended
+        with its AMAF mean"""
+        n: np.ndarray = self._child_n[:nb]
+        amaf_n: np.ndarray = self._child_amaf_n[:nb]
+        mean: np.ndarray = self._child_q[:nb] / n
+        amaf: np.ndarray = np.divide(
+            self._child_amaf_q[:nb], amaf_n, out=mean.copy(), where=amaf_n > 0
+        )
+        beta: np.ndarray = np.sqrt(self.rave / (3 * n + self.rave))
+        values: np.ndarray = (1 - beta) * mean + beta * amaf
+        values += c_param * np.sqrt(log_n / n) + self._child_penalty[:nb]
+        return int(np.argmax(values))
+
+    def final_child(self):
+        """Return the child to play after a search: a winning child if the node
+        is proven won, the most visited one if it is proven lost"""
+        if self.proven is None:
+            return self.best_child()
+        if self.proven == self.player_to_move:
+            return next(c for c in self.children if c.proven == self.proven)
+        return max(self.children, key=lambda c: c.n())
 
     def _tree_policy(self, env):
         """Select the best node to explore"""
@@ -99,7 +286,11 @@ class MCTSNode:
         while not current_node.is_terminal_node(env):
 
             if not current_node.is_fully_expanded():
-                return current_node.expand(env), stack
+                # the rollout starts from the position of the new child
+                current_node = current_node.expand(env)
+                stack.append(current_node.parent_action)
+                env.play(current_node.parent_action)
+                return current_node, stack
 
             current_node = current_node.best_child()
             stack.append(current_node.parent_action)
@@ -107,15 +298,82 @@ class MCTSNode:
 
         return current_node, stack
 
-    def best_action(self, env, nb_simu=1000):
-        """Return the best action to play"""
+    def best_action(self, env, nb_simu=1000, batch_size=1, deadline=math.inf):
+        """Run nb_simu simulations, less if the deadline (time.perf_counter()) is
+        reached first, and return the best child found"""
         nd: MCTSNode
         stack: deque[Action]
-        for _ in range(nb_simu):
+        for i in range(nb_simu):
+            if i and not i % CHECK_EVERY and time.perf_counter() >= deadline:
+                break
+            if self.proven is not None:
+                break  # the result of the game is known
             nd, stack = self._tree_policy(env)
-            reward = nd.rollout(env)
+            # the moves of the playout feed RAVE, not available for batches
+            moves: dict = {RED: set(), BLUE: set()}
+            if not self.rave or batch_size > 1:
+                moves = None
+            red_wins = nd.rollout(env, batch_size, moves)
             while len(stack) > 0:
                 env.undo(stack.pop())
-            nd.backpropagate(reward)
+            nd.backpropagate(red_wins, batch_size, moves)
+
+        return self.final_child()
+
+
+def reroot(root: MCTSNode, action: Action) -> MCTSNode:
+    """Return the child of the root reached by the action as a new root, None
+    if it was never expanded (the tree cannot be reused). The rest of an
+    MCTSNode tree is discarded."""
+    if not root:
+        return None
+    new_root = None
+    for child in root.children:
+        if child.parent_action == action:
+            new_root = child
+    if isinstance(root, MCTSNode):
+        root.discard(keep=new_root)
+        if new_root:
+            new_root.parent = None
+    return new_root
+
+
+def tree_size(root: MCTSNode) -> int:
+    """Return the number of nodes of the tree"""
+    res: int = 0
+    stack: list[MCTSNode] = [root]
+    while stack:
+        node = stack.pop()
+        res += 1
+        stack.extend(node.children)
+    return res
+
+
+def prune(root: MCTSNode, max_nodes: int) -> int:
+    """Remove the children of the proven nodes which do not prove their result
+    (the proven nodes are never selected again), then the least visited
+    subtrees (proven nodes apart) until the tree has at most about max_nodes
+    nodes. Return the number of nodes kept."""
+    visits: list[int] = []
+    stack: list[MCTSNode] = [root]
+    while stack:
+        node = stack.pop()
+        if node.proven is not None:
+            # only the children which prove the result are needed
+            node.remove_children(lambda child: child.proven == node.proven)
+        visits.append(node.n())
+        stack.extend(node.children)
 
-        return self.best_child()
+    if len(visits) > max_nodes:
+        # the visits never grow from a node to its children: the nodes of at
+        # least min_visits visits make a tree
+        visits.sort(reverse=True)
+        min_visits: int = visits[max_nodes] + 1
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.remove_children(
+                lambda child: child.n() >= min_visits or child.proven is not None
+            )
+            stack.extend(node.children)
+    return tree_size(root)
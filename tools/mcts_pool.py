@@ -0,0 +1,207 @@
+"""Monte Carlo Tree Search on a preallocated pool of nodes"""
+
+from array import array
+import math
+import time
+
+from client.gndclient import Action, Player, RED
+from tools.mcts import CHECK_EVERY
+
+# default maximum number of nodes of a pool
+POOL_SIZE = 1 << 20
+
+# exploration constant of the UCB formula, as MCTSNode.best_child
+C_PARAM = math.sqrt(2)
+
+NO_NODE = -1  # parent of the root, first child of a node not expanded yet
+
+
+class NodePool:
+    """Tree of the Monte Carlo Tree Search stored as a struct of arrays
+
+    Node i is described by visits[i], wins[i], parent[i], first_child[i],
+    nb_children[i] and action[i] (index in the actions table). The children
+    of a node are all created at once, at consecutive indexes, when the node
+    is expanded. Like MCTSNode, the wins are counted for the player of the
+    root. Once the pool is full, the leaves are no longer expanded.
+    """
+
+    def __init__(self, player: Player, capacity: int = POOL_SIZE):
+        self.player: Player = player
+        self.capacity: int = capacity
+        self.size: int = 0
+        self.visits: array = array("I", bytes(4 * capacity))
+        self.wins: array = array("I", bytes(4 * capacity))
+        self.parent: array = array("i", [NO_NODE]) * capacity
+        self.first_child: array = array("i", [NO_NODE]) * capacity
+        self.nb_children: array = array("H", bytes(2 * capacity))
+        self.action: array = array("I", bytes(4 * capacity))
+
+        # actions table, each action is stored once
+        self.actions: list[Action] = []
+        self._action_index: dict[Action, int] = {}
+
+    def new_node(self, parent: int, action: Action) -> int:
+        """Add a node, return its index"""
+        i: int = self.size
+        self.size += 1
+        self.parent[i] = parent
+        if action is not None:
+            if action not in self._action_index:
+                self._action_index[action] = len(self.actions)
+                self.actions.append(action)
+            self.action[i] = self._action_index[action]
+        return i
+
+    def expand(self, node: int, leg: list[Action]) -> bool:
+        """Create all the children of a node, return False if the pool is full"""
+        if self.size + len(leg) > self.capacity:
+            return False
+        self.first_child[node] = self.size
+        self.nb_children[node] = len(leg)
+        for action in leg:
+            self.new_node(node, action)
+        return True
+
+    def select(self, node: int) -> int:
+        """Return the child of a node with the best UCB value, a child never
+        visited first"""
+        first: int = self.first_child[node]
+        visits, wins = self.visits, self.wins
+        log_n: float = math.log(visits[node])
+        best: int = first
+        best_value: float = -math.inf
+        for i in range(first, first + self.nb_children[node]):
+            n: int = visits[i]
+            if n == 0:
+                return i
+            value: float = (2 * wins[i] - n) / n + C_PARAM * math.sqrt(log_n / n)
+            if value > best_value:
+                best, best_value = i, value
+        return best
+
+    def backpropagate(self, node: int, red_wins: int, nb: int = 1):
+        """Update the node and its ancestors with the results of nb simulations"""
+        wins: int = red_wins if self.player == RED else nb - red_wins
+        while node != NO_NODE:
+            self.visits[node] += nb
+            self.wins[node] += wins
+            node = self.parent[node]
+
+    def subtree(self, node: int) -> "NodePool":
+        """Copy the subtree of a node in a new pool, the node being its root"""
+        res = NodePool(self.player, self.capacity)
+        res.actions, res._action_index = self.actions, self._action_index
+        queue: list[tuple[int, int]] = [(node, res.new_node(NO_NODE, None))]
+        for old, new in queue:
+            res.visits[new] = self.visits[old]
+            res.wins[new] = self.wins[old]
+            first: int = self.first_child[old]
+            if first == NO_NODE:
+                continue
+            res.first_child[new] = res.size
+            res.nb_children[new] = self.nb_children[old]
+            for i in range(first, first + self.nb_children[old]):
+                child: int = res.new_node(new, None)
+                res.action[child] = self.action[i]
+                queue.append((i, child))
+        return res
+
+    def nbytes(self) -> int:
+        """Return the memory used by the arrays of the pool"""
+        arrays = (
+            self.visits,
+            self.wins,
+            self.parent,
+            self.first_child,
+            self.nb_children,
+            self.action,
+        )
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def bytes_per_node(self) -> int:
+        """Return the memory used by one node"""
+        return self.nbytes() // self.capacity
+
+
+class PoolNode:
+    """Handle on a node of a pool, with the interface of MCTSNode"""
+
+    __slots__ = ("pool", "index")
+
+    def __init__(self, pool: NodePool, index: int = 0):
+        self.pool: NodePool = pool
+        self.index: int = index
+
+    def n(self) -> int:
+        """Return the number of visits of the node"""
+        return self.pool.visits[self.index]
+
+    def q(self) -> int:
+        """Return the number of wins minus the number of loses of the node"""
+        return 2 * self.pool.wins[self.index] - self.pool.visits[self.index]
+
+    @property
+    def parent(self) -> "PoolNode":
+        """Parent of the node, None for the root"""
+        parent: int = self.pool.parent[self.index]
+        return None if parent == NO_NODE else PoolNode(self.pool, parent)
+
+    @property
+    def parent_action(self) -> Action:
+        """Action which leads to the node, None for the root"""
+        if self.pool.parent[self.index] == NO_NODE:
+            return None
+        return self.pool.actions[self.pool.action[self.index]]
+
+    @property
+    def children(self) -> list["PoolNode"]:
+        """Children of the node, empty if it is not expanded"""
+        first: int = self.pool.first_child[self.index]
+        if first == NO_NODE:
+            return []
+        return [
+            PoolNode(self.pool, i)
+            for i in range(first, first + self.pool.nb_children[self.index])
+        ]
+
+    def best_action(
+        self, env, nb_simu: int = 1000, batch_size: int = 1, deadline=math.inf
+    ):
+        """Run nb_simu simulations from the node (env being at its position),
+        less if the deadline (time.perf_counter()) is reached first, each leaf
+        evaluated with batch_size playouts, return the most visited child"""
+        pool: NodePool = self.pool
+        for i in range(nb_simu):
+            if i and not i % CHECK_EVERY and time.perf_counter() >= deadline:
+                break
+            node: int = self.index
+            stack: list[Action] = []
+            while pool.nb_children[node] > 0:
+                node = pool.select(node)
+                stack.append(pool.actions[pool.action[node]])
+                env.play(stack[-1])
+
+            # a leaf is expanded from its second visit (the root at once)
+            if pool.first_child[node] == NO_NODE and (
+                pool.visits[node] > 0 or node == self.index
+            ):
+                leg: list[Action] = env.legals()
+                if leg and pool.expand(node, leg):
+                    node = pool.first_child[node]
+                    stack.append(pool.actions[pool.action[node]])
+                    env.play(stack[-1])
+
+            if batch_size > 1:
+                red_wins: int = env.batch_playouts(batch_size)
+            else:
+                red_wins = 1 if env.random_playout() == RED else 0
+            while stack:
+                env.undo(stack.pop())
+            pool.backpropagate(node, red_wins, batch_size)
+
+        if not self.children:
+            raise ValueError(
+                f"a pool of {pool.capacity} nodes cannot hold the children of the node"
+            )
+        return max(self.children, key=lambda c: c.n())
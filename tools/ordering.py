@@ -0,0 +1,92 @@
+"""Move ordering for the alpha beta search"""
+
+from client.gndclient import Action, Player, RED, BLUE
+
+# number of killer moves kept per ply
+NB_KILLERS = 2
+
+# move sources, in the order the moves are searched
+SOURCES = ["tt", "killer", "history", "other"]
+
+
+class MoveOrdering:
+    """Order the moves of a node: transposition table move first, then the
+    killer moves of the ply, then the others by history score
+
+    Each source counts the moves it placed first and the cutoffs produced
+    by its moves, to measure how much it reduces the search.
+    """
+
+    def __init__(
+        self, use_tt: bool = True, use_killers: bool = True, use_history: bool = True
+    ):
+        self.use_tt: bool = use_tt
+        self.use_killers: bool = use_killers
+        self.use_history: bool = use_history
+
+        # killers[ply] : last moves that produced a cutoff at this ply
+        self.killers: list[list[Action]] = []
+        # history[player][action] : sum of depth^2 of the cutoffs of the move
+        self.history: dict[Player, dict[Action, int]] = {RED: {}, BLUE: {}}
+
+        # counters
+        self.first: dict[str, int] = dict.fromkeys(SOURCES, 0)
+        self.cutoffs: dict[str, int] = dict.fromkeys(SOURCES, 0)
+
+    def new_search(self):
+        """Forget the killers and age the history before a new move"""
+        self.killers = []
+        for table in self.history.values():
+            for action in table:
+                table[action] //= 2
+
+    def order(
+        self, leg: list[Action], ply: int, tt_action: Action, player: Player
+    ) -> list[Action]:
+        """Return the moves in the order they should be searched"""
+        front: list[Action] = []
+        if self.use_tt and tt_action is not None and tt_action in leg:
+            front.append(tt_action)
+        if self.use_killers and ply < len(self.killers):
+            for killer in self.killers[ply]:
+                if killer in leg and killer not in front:
+                    front.append(killer)
+
+        rest: list[Action] = [action for action in leg if action not in front]
+        if self.use_history:
+            history = self.history[player]
+            rest.sort(key=lambda action: history.get(action, 0), reverse=True)
+
+        res: list[Action] = front + rest
+        self.first[self.source(res[0], ply, tt_action, player)] += 1
+        return res
+
+    def source(self, action: Action, ply: int, tt_action: Action, player: Player) -> str:
+        """Return the source which placed the move"""
+        if self.use_tt and action == tt_action:
+            return "tt"
+        if self.use_killers and ply < len(self.killers) and action in self.killers[ply]:
+            return "killer"
+        if self.use_history and self.history[player].get(action, 0) > 0:
+            return "history"
+        return "other"
+
+    def cutoff(
+        self, action: Action, ply: int, depth: int, tt_action: Action, player: Player
+    ):
+        """Record a move which produced a cutoff"""
+        self.cutoffs[self.source(action, ply, tt_action, player)] += 1
+
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[NB_KILLERS:]
+
+        history = self.history[player]
+        history[action] = history.get(action, 0) + depth * depth
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Return the counters of each source"""
+        return {"first": dict(self.first), "cutoffs": dict(self.cutoffs)}
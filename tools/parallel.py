@@ -0,0 +1,245 @@
+"""Parallel searches on a pool of processes"""
+
+import atexit
+import math
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.pool import Pool
+from typing import Callable, Optional
+
+from client.gndclient import Action, RED
+from tools import batch
+from tools.mcts import MCTSNode
+from tools.shared_tt import SharedTranspositionTable
+
+# position sent to the workers: (engine class, game, state, player, hex_size)
+Position = tuple[type, str, dict, int, int]
+
+# statistics of a root child: (action, visits, wins, loses)
+ChildStats = tuple[Action, int, int, int]
+
+# kinds of parallel MCTS
+ROOT_PARALLEL = "root"  # one tree per worker, root statistics added up
+TREE_PARALLEL = "tree"  # one shared tree, rollouts run by the workers
+
+# leaves selected per worker before the rollouts are sent, to amortize the
+# cost of the messages to the processes
+LEAVES_PER_WORKER = 4
+
+_pool: Optional[Pool] = None
+_pool_size: int = 0
+_threads: Optional[ThreadPoolExecutor] = None
+
+# shared transposition tables the worker process is attached to, by name
+_tables: dict[str, SharedTranspositionTable] = {}
+
+
+def get_pool(size: int) -> Pool:
+    """Return the pool of worker processes, created on first use"""
+    global _pool, _pool_size
+    if _pool is None or _pool_size != size:
+        close_pool()
+        _pool = multiprocessing.Pool(size)
+        _pool_size = size
+    return _pool
+
+
+def get_threads(size: int) -> ThreadPoolExecutor:
+    """Return the pool of worker threads, created on first use"""
+    global _threads
+    if _threads is None or _threads._max_workers != size:
+        if _threads is not None:
+            _threads.shutdown()
+        _threads = ThreadPoolExecutor(size)
+    return _threads
+
+
+@atexit.register
+def close_pool():
+    """Stop the worker processes and threads"""
+    global _pool, _threads
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+    if _threads is not None:
+        _threads.shutdown()
+        _threads = None
+
+
+def free_threading() -> bool:
+    """Check if the threads run in parallel (Python built without the GIL)"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def position(env) -> Position:
+    """Picklable description of the position of an environment"""
+    return type(env), env.game, dict(env.state), env.player, env.hex_size
+
+
+def new_env(pos: Position):
+    """Environment on a position, without cache nor tree"""
+    engine, game, state, player, hex_size = pos
+    return engine(game, state, player, hex_size, 0)
+
+
+def _mcts_worker(
+    args: tuple[Position, int, int, int, float, float]
+) -> list[ChildStats]:
+    """Build a tree from the position with its own seed during at most
+    time_budget seconds, return the root children"""
+    pos, nb_simu, batch_size, seed, time_budget, rave = args
+    deadline: float = time.perf_counter() + time_budget
+    random.seed(seed)
+    batch.seed(seed)
+    env = new_env(pos)
+    env.update_symmetries()
+    root = MCTSNode(env.distinct_legals(), env.player, rave=rave)
+    root.best_action(env, nb_simu=nb_simu, batch_size=batch_size, deadline=deadline)
+    return [
+        (child.parent_action, child.n(), child._wins, child._loses)
+        for child in root.children
+    ]
+
+
+def _rollout_worker(args: tuple[Position, int, int]) -> int:
+    """Play batch_size random games from the position, return the RED wins"""
+    pos, batch_size, seed = args
+    random.seed(seed)
+    batch.seed(seed)
+    env = new_env(pos)
+    if batch_size > 1:
+        return env.batch_playouts(batch_size)
+    return 1 if env.random_playout() == RED else 0
+
+
+def root_parallel_mcts(
+    env,
+    root: MCTSNode,
+    nb_simu: int,
+    workers: int,
+    batch_size: int = 1,
+    deadline: float = math.inf,
+) -> tuple[MCTSNode, int]:
+    """Root parallel MCTS: workers - 1 processes build their own tree from the
+    position while this process searches the (reused) root, then the visits of
+    the root children are added up to choose the move. The trees of the
+    workers are only counted, the reused tree keeps its own statistics. Return
+    the most visited child and the simulations of the workers."""
+    if root.proven is not None:
+        return root.final_child(), 0  # nothing to search
+
+    pool = get_pool(workers - 1)
+    pos = position(env)
+    time_budget: float = deadline - time.perf_counter()
+    jobs = [
+        (pos, nb_simu, batch_size, random.getrandbits(32), time_budget, root.rave)
+        for _ in range(workers - 1)
+    ]
+    results = pool.map_async(_mcts_worker, jobs)
+
+    # this process searches the real tree, so that it can be reused
+    root.best_action(env, nb_simu=nb_simu, batch_size=batch_size, deadline=deadline)
+
+    # visits of each move in all the trees
+    tally: dict[Action, int] = {child.parent_action: child.n() for child in root.children}
+    simulations: int = 0
+    for children in results.get():
+        for action, visits, _, _ in children:
+            tally[action] = tally.get(action, 0) + visits
+            simulations += visits
+
+    if root.proven is not None:
+        return root.final_child(), simulations
+    return root.child(env, max(tally, key=tally.get)), simulations
+
+
+def tree_parallel_mcts(
+    env,
+    root: MCTSNode,
+    nb_simu: int,
+    workers: int,
+    batch_size: int = 1,
+    deadline: float = math.inf,
+) -> MCTSNode:
+    """Tree parallel MCTS: this process selects LEAVES_PER_WORKER leaves per
+    worker in the shared tree, a virtual loss on each path spreading them over
+    the branches, then the workers play the rollouts of the leaves at once.
+    The workers are threads when Python runs without the GIL, processes
+    otherwise. Return the most visited child."""
+    if free_threading():
+        run: Callable = get_threads(workers).map
+    else:
+        run = get_pool(workers).map
+
+    done: int = 0
+    while done < nb_simu and (not done or time.perf_counter() < deadline):
+        if root.proven is not None:
+            break  # the result of the game is known
+        leaves: list[MCTSNode] = []
+        jobs: list[tuple[Position, int, int]] = []
+        for _ in range(min(workers * LEAVES_PER_WORKER, nb_simu - done)):
+            if root.proven is not None:
+                break
+            node, stack = root._tree_policy(env)
+            jobs.append((position(env), batch_size, random.getrandbits(32)))
+            while stack:
+                env.undo(stack.pop())
+            node.add_virtual_loss(batch_size)
+            leaves.append(node)
+
+        for node, red_wins in zip(leaves, run(_rollout_worker, jobs)):
+            node.add_virtual_loss(-batch_size)
+            node.backpropagate(red_wins, batch_size)
+        done += len(leaves)
+
+    if root.proven is not None:
+        return root.final_child()
+    return max(root.children, key=lambda c: c.n())
+
+
+def _lazy_smp_worker(
+    args: tuple[Position, str, int, float, int, int]
+) -> tuple[int, Action]:
+    """Iterative deepening from first_depth with the shared transposition
+    table, return the depth reached and its move"""
+    pos, name, size_log2, time_budget, max_depth, first_depth = args
+    env = new_env(pos)
+    if name not in _tables:
+        _tables[name] = SharedTranspositionTable(env.hex_size, size_log2, name)
+    env._cache = _tables[name]
+    action = env.strategy_iterative_deepening(time_budget, max_depth, first_depth)
+    return env.depth_reached, action
+
+
+def lazy_smp(
+    env, time_budget: float, max_depth: int, workers: int, new_search: bool = True
+) -> Action:
+    """Lazy SMP: workers - 1 processes run the iterative deepening of the
+    position while this process runs its own, all of them sharing the
+    transposition table of env. Every other worker starts at depth 2, so that
+    they do not search the same depths at the same time, and the others
+    mostly find the results of the first one in the table. Return the move of
+    the deepest complete search."""
+    table: SharedTranspositionTable = env.cache
+    size_log2: int = table.size.bit_length() - 1
+    pos = position(env)
+    deadline: float = time.perf_counter() + time_budget
+    jobs = [
+        (pos, table.name, size_log2, time_budget, max_depth, 1 + i % 2)
+        for i in range(1, workers)
+    ]
+    results = get_pool(workers - 1).map_async(_lazy_smp_worker, jobs)
+
+    action: Action = env.strategy_iterative_deepening(
+        deadline - time.perf_counter(), max_depth, new_search=new_search
+    )
+    depth: int = env.depth_reached
+    for worker_depth, worker_action in results.get():
+        if worker_depth > depth:
+            depth, action = worker_depth, worker_action
+    env.depth_reached = depth
+    return action
@@ -0,0 +1,163 @@
+"""Depth-first proof-number search (df-pn)"""
+
+import math
+import time
+from typing import Optional
+
+from client.gndclient import Action, Player
+
+# proof or disproof number of a solved node
+PN_INF = 10**9
+
+# default number of nodes expanded by a search
+PNS_MAX_NODES = 200000
+
+# nodes expanded between two reads of the clock
+CHECK_EVERY = 256
+
+
+class ProofAborted(Exception):
+    """Raised inside a search when its node or time budget is over"""
+
+
+class ProofNumberSearch:
+    """Depth-first proof-number search of the position of env, in negamax form
+
+    Every node is seen from its player to move: phi is the proof number of its
+    win (0 once proven) and delta the disproof number (0 once it is lost), with
+    phi = min of the delta of the children and delta = sum of their phi. A new
+    node starts at phi = 1 and delta = its number of moves. The numbers are
+    kept in a transposition table indexed by the keys of the positions (up to
+    the symmetries used by env).
+    """
+
+    def __init__(self, env, max_nodes: int = PNS_MAX_NODES, deadline=math.inf):
+        self.env = env
+        self.max_nodes: int = max_nodes
+        self.deadline: float = deadline
+        self.table: dict[int, tuple[int, int]] = {}
+        self.nodes: int = 0
+        self.elapsed: float = 0.0
+
+    def solve(self) -> Optional[bool]:
+        """Search until the position is solved or the budget is over, return
+        True if the player to move wins, False if it loses, None if unknown"""
+        start: float = time.perf_counter()
+        key: int = self.env.canonical_key()[0]
+        self.table.setdefault(key, self._new_entry())
+        try:
+            self._mid(key, PN_INF, PN_INF)
+        except ProofAborted:
+            pass
+        finally:
+            self.elapsed = time.perf_counter() - start
+        phi, delta = self.table[key]
+        if phi == 0:
+            return True
+        if delta == 0:
+            return False
+        return None
+
+    def _new_entry(self) -> tuple[int, int]:
+        """Proof and disproof numbers of a position seen for the first time"""
+        env = self.env
+        leg: list[Action] = env.legals()
+        winner: Player = None if leg else env.winner()
+        if winner is None:
+            winner = env.known_winner()
+        if winner is None:
+            return 1, len(leg)
+        return (0, PN_INF) if winner == env.player else (PN_INF, 0)
+
+    def _mid(self, key: int, phi_max: int, delta_max: int):
+        """Search the node of the key until its phi reaches phi_max or its
+        delta reaches delta_max"""
+        phi, delta = self.table[key]
+        if phi >= phi_max or delta >= delta_max:
+            return
+        self.nodes += 1
+        if self.nodes >= self.max_nodes or (
+            not self.nodes % CHECK_EVERY and time.perf_counter() > self.deadline
+        ):
+            raise ProofAborted
+
+        env = self.env
+        table = self.table
+        children: list[tuple[Action, int]] = []
+        for action in env.legals():
+            env.play(action)
+            child: int = env.canonical_key()[0]
+            if child not in table:
+                table[child] = self._new_entry()
+            env.undo(action)
+            children.append((action, child))
+
+        while True:
+            # phi is the smallest delta of the children, second the next one
+            phi, second, delta = PN_INF, PN_INF, 0
+            best: int = 0
+            for i, (_, child) in enumerate(children):
+                child_phi, child_delta = table[child]
+                delta += child_phi
+                if child_delta < phi:
+                    phi, second, best = child_delta, phi, i
+                elif child_delta < second:
+                    second = child_delta
+            delta = min(delta, PN_INF)
+            table[key] = (phi, delta)
+            if phi >= phi_max or delta >= delta_max:
+                return
+
+            action, child = children[best]
+            child_phi: int = table[child][0]
+            env.play(action)
+            try:
+                self._mid(child, delta_max - delta + child_phi, min(phi_max, second + 1))
+            finally:
+                env.undo(action)
+
+    def best_move(self) -> Action:
+        """Return a winning move if the position is proven, otherwise the move
+        whose disproof is the closest (None without moves)"""
+        env = self.env
+        best: Action = None
+        best_delta: int = PN_INF + 1
+        for action in env.legals():
+            env.play(action)
+            entry: Optional[tuple[int, int]] = self.table.get(env.canonical_key()[0])
+            env.undo(action)
+            child_delta: int = entry[1] if entry is not None else PN_INF
+            if child_delta < best_delta:
+                best, best_delta = action, child_delta
+        return best
+
+    def proof_size(self) -> int:
+        """Return the number of positions of the proof tree of a solved
+        position: one winning move for the won positions, every move for the
+        lost ones"""
+        env = self.env
+        seen: set[int] = set()
+
+        def walk():
+            key: int = env.canonical_key()[0]
+            if key in seen:
+                return
+            seen.add(key)
+            phi, delta = self.table.get(key, (1, 1))
+            for action in env.legals():
+                env.play(action)
+                child: tuple[int, int] = self.table.get(env.canonical_key()[0], (1, 1))
+                if delta == 0 or (phi == 0 and child[1] == 0):
+                    walk()
+                    env.undo(action)
+                    if phi == 0:
+                        return
+                else:
+                    env.undo(action)
+
+        walk()
+        return len(seen)
+
+    def nodes_per_second(self) -> float:
+        """Return the number of nodes expanded per second"""
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
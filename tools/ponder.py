@@ -0,0 +1,88 @@
+"""Search during the time of the opponent (pondering)"""
+
+import math
+import threading
+from typing import Optional
+
+from client.gndclient import DODO_STR
+
+# simulations between two checks of the stop request
+PONDER_CHUNK = 64
+
+
+class Ponder:
+    """Keep searching the position of the opponent until its move arrives
+
+    Dodo goes on with the simulations of the MCTS tree of the environment,
+    which is then re-rooted on the move of the opponent. Gopher runs the
+    iterative deepening on the position of the opponent, which fills the
+    transposition table used by the next search: it starts the age of the
+    table of that search, which is then run with new_search=False.
+
+    The search runs in a thread of this process rather than in another
+    process: the tree and the table have to stay in this process to be
+    reused, and the main thread only waits for the HTTP answer of the
+    server, which releases the GIL.
+    """
+
+    def __init__(self, max_depth: int):
+        self.max_depth: int = max_depth
+        self.env = None
+        self.simulations: int = 0
+        self.depth_reached: int = 0
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, env):
+        """Start to search the position of the environment in the background"""
+        if env.final():
+            return
+        self.env = env
+        self.simulations = 0
+        self.depth_reached = 0
+        if env.game != DODO_STR:
+            # the search of our next move starts now: the entries of the
+            # pondering get its age, and it must not start a new one
+            env.cache.new_search()
+            env.ordering.new_search()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the search and wait for the thread, the environment being
+        restored to the position of the opponent"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        while self._thread.is_alive():
+            # makes the iterative deepening raise SearchTimeout
+            self.env._deadline = -math.inf
+            self._thread.join(0.01)
+        self.env._deadline = math.inf
+        self._thread = None
+
+    def _run(self):
+        """Search until the stop request"""
+        env = self.env
+        if env.game == DODO_STR:
+            root = env.root
+            if root is None:
+                return
+            visits: int = root.n()
+            while not self._stop.is_set() and root.proven is None:
+                root.best_action(env, PONDER_CHUNK)
+            self.simulations = root.n() - visits
+        elif not self._stop.is_set():
+            env.strategy_iterative_deepening(
+                math.inf, self.max_depth, new_search=False
+            )
+            self.depth_reached = env.depth_reached
+
+    def report(self) -> str:
+        """Describe the work of the last pondering"""
+        if self.env is None:
+            return "no pondering"
+        if self.env.game == DODO_STR:
+            return f"{self.simulations} simulations"
+        return f"depth {self.depth_reached}"
@@ -0,0 +1,280 @@
+"""Independent regions of late Gopher positions
+
+A stone only changes the legality of its neighbours, and a cell where a player
+can no longer play (a friendly neighbour or two enemy ones) never becomes
+playable again. The empty cells still playable by someone therefore split into
+regions, connected by adjacency, whose moves cannot affect each other.
+
+Gopher is partisan, so the regions do not combine by their parity alone: a
+region where a single player can move is worth a number of spare moves for
+that player (the largest set of its legal cells without two neighbours), the
+spare moves of both players cancel each other, and only the regions where both
+players can move are searched, together, with the net number of spare moves.
+The results are cached by the shape of the regions and the stones around them,
+translated to the corner of the board, so that the same region found anywhere
+on the board or in another branch of the search is solved once.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+from client.gndclient import Action, Player, RED, BLUE
+from tools.bitboard import (
+    GOPHER_DIRECTIONS,
+    BoardLayout,
+    board_layout,
+    neighbor_counts,
+)
+
+# positions with more playable cells than that are not analysed
+REGION_CELLS_MAX = 40
+
+# the regions where both players can move are searched if they have at most
+# this number of cells in all
+MIXED_CELLS_MAX = 14
+
+# entries of each cache of region results
+REGION_CACHE_SIZE = 1 << 17
+
+
+@lru_cache(maxsize=None)
+def _shifts(width: int) -> tuple[list[int], list[int]]:
+    """Shifts of the neighbour bits, split by sign to avoid negative shifts"""
+    shifts: list[int] = [dq + dr * width for dq, dr in GOPHER_DIRECTIONS]
+    return [k for k in shifts if k > 0], [-k for k in shifts if k < 0]
+
+
+def flood(seeds: int, live: int, width: int) -> int:
+    """Cells of live connected to the seeds"""
+    right, left = _shifts(width)
+    region: int = seeds & live
+    while True:
+        grown: int = region
+        for k in right:
+            grown |= region >> k
+        for k in left:
+            grown |= region << k
+        grown &= live
+        if grown == region:
+            return region
+        region = grown
+
+
+def _bits(mask: int) -> list[int]:
+    """Return the single bit masks of the bits set in the mask"""
+    res: list[int] = []
+    while mask:
+        low = mask & -mask
+        res.append(low)
+        mask ^= low
+    return res
+
+
+def split_regions(live: int, width: int) -> list[int]:
+    """Split the cells of a mask into connected regions, by flood fill"""
+    res: list[int] = []
+    while live:
+        region: int = flood(live & -live, live, width)
+        res.append(region)
+        live ^= region
+    return res
+
+
+def playable(live: int, red: int, blue: int, width: int) -> dict[Player, tuple[int, int]]:
+    """Cells of live that each player can play now or later (no friendly
+    neighbour, at most one enemy neighbour), and the ones it can play now"""
+    right, left = _shifts(width)
+    red_once, blue_once, blue_twice = neighbor_counts(red, blue, right, left)
+    _, _, red_twice = neighbor_counts(0, red, right, left)
+    red_open: int = live & ~red_once & ~blue_twice
+    blue_open: int = live & ~blue_once & ~red_twice
+    return {
+        RED: (red_open, red_open & blue_once),
+        BLUE: (blue_open, blue_open & red_once),
+    }
+
+
+def normalize(width: int, *masks: int) -> tuple[int, ...]:
+    """Translate the masks together to the first row and column of the grid"""
+    union: int = 0
+    for mask in masks:
+        union |= mask
+    if not union:
+        return masks
+    row: int = ((union & -union).bit_length() - 1) // width
+    # columns of the cells, the rows being folded onto the first one
+    row_mask: int = (1 << width) - 1
+    columns: int = 0
+    union >>= row * width
+    while union:
+        columns |= union & row_mask
+        union >>= width
+    shift: int = row * width + (columns & -columns).bit_length() - 1
+    return tuple(mask >> shift for mask in masks)
+
+
+@lru_cache(maxsize=REGION_CACHE_SIZE)
+def spare_moves(cells: int, width: int) -> int:
+    """Number of moves a player can make alone in a region, its legal cells
+    being given (translated by normalize): the largest set of cells without
+    two neighbours, a move forbidding the cells around it"""
+    memo: dict[int, int] = {}
+    right, left = _shifts(width)
+
+    def largest(mask: int) -> int:
+        if not mask:
+            return 0
+        if mask in memo:
+            return memo[mask]
+        low: int = mask & -mask
+        near: int = neighbor_counts(0, low, right, left)[1] & mask
+        res: int = 1 + largest(mask & ~low & ~near)
+        if near:
+            res = max(res, largest(mask & ~low))
+        memo[mask] = res
+        return res
+
+    return largest(cells)
+
+
+def reach(cells: dict[Player, tuple[int, int]], width: int) -> tuple[int, int, int]:
+    """Playable cells, and the ones in a region where RED, BLUE can play: the
+    regions where both can play are the cells of the last two"""
+    live: int = cells[RED][0] | cells[BLUE][0]
+    return live, flood(cells[RED][0], live, width), flood(cells[BLUE][0], live, width)
+
+
+def decompose(
+    live: int, red: int, blue: int, width: int
+) -> tuple[int, int, dict[Player, tuple[int, int]]]:
+    """Split the playable cells of live into regions: return the spare moves
+    of RED minus the ones of BLUE in the regions where a single player can
+    move, the cells of the other regions, and the playable cells"""
+    cells = playable(live, red, blue, width)
+    red_legal: int = cells[RED][1]
+    blue_legal: int = cells[BLUE][1]
+    live, near_red, near_blue = reach(cells, width)
+    spare: int = 0
+    for region in split_regions(live & ~near_blue, width):
+        spare += spare_moves(normalize(width, region & red_legal)[0], width)
+    for region in split_regions(live & ~near_red, width):
+        spare -= spare_moves(normalize(width, region & blue_legal)[0], width)
+    return spare, near_red & near_blue, cells
+
+
+@lru_cache(maxsize=REGION_CACHE_SIZE)
+def mover_wins(
+    live: int, red: int, blue: int, width: int, player: Player, spare: int
+) -> bool:
+    """True if the player to move wins the game made of the cells of live, the
+    stones around them and spare moves for RED (for BLUE if negative)"""
+    more, mixed, cells = decompose(live, red, blue, width)
+    spare += more
+    own: int = spare if player == RED else -spare
+    if not mixed:
+        return own > 0
+
+    near: int = neighbor_counts(0, mixed, *_shifts(width))[1]
+    for bit in _bits(cells[player][1] & mixed):
+        if player == RED:
+            child = normalize(width, mixed ^ bit, (red | bit) & near, blue & near)
+        else:
+            child = normalize(width, mixed ^ bit, red & near, (blue | bit) & near)
+        if not mover_wins(*child, width, 3 - player, spare):
+            return True
+    # a spare move is one more move the player can always make
+    if own > 0:
+        child = normalize(width, mixed, red & near, blue & near)
+        return not mover_wins(
+            *child, width, 3 - player, spare - 1 if player == RED else spare + 1
+        )
+    return False
+
+
+def stone_masks(env, layout: BoardLayout) -> tuple[int, int]:
+    """Stones of RED and BLUE as masks of the bitboard layout"""
+    if hasattr(env, "_red"):
+        return env._red, env._blue
+    red: int = 0
+    blue: int = 0
+    for cell, play in env.state.items():
+        if play == RED:
+            red |= layout.bit[cell]
+        elif play == BLUE:
+            blue |= layout.bit[cell]
+    return red, blue
+
+
+def board_split(env) -> bool:
+    """Check if the region analysis can pay for itself in the position of env:
+    at most REGION_CELLS_MAX playable cells, split into several regions"""
+    layout: BoardLayout = board_layout(env.hex_size)
+    red, blue = stone_masks(env, layout)
+    if not red and not blue:
+        return False
+    cells = playable(layout.mask & ~(red | blue), red, blue, layout.width)
+    live: int = cells[RED][0] | cells[BLUE][0]
+    if live.bit_count() > REGION_CELLS_MAX:
+        return False
+    return flood(live & -live, live, layout.width) != live
+
+
+class RegionSolver:
+    """Region analysis of the Gopher positions of a board size, probed by the
+    searches like the endgame tables"""
+
+    def __init__(self, hex_size: int):
+        self.hex_size: int = hex_size
+        self._layout: BoardLayout = board_layout(hex_size)
+        self.width: int = self._layout.width
+        self.probes: int = 0
+        self.solved: int = 0
+
+    def probe(self, env) -> Optional[bool]:
+        """Return True if the player to move wins the position of env, False if
+        it loses, None if it has too many playable cells to be analysed"""
+        red, blue = stone_masks(env, self._layout)
+        if not red and not blue:
+            return None
+        self.probes += 1
+        cells = playable(self._layout.mask & ~(red | blue), red, blue, self.width)
+        live: int = cells[RED][0] | cells[BLUE][0]
+        if live.bit_count() > REGION_CELLS_MAX:
+            return None
+        live, near_red, near_blue = reach(cells, self.width)
+        if (near_red & near_blue).bit_count() > MIXED_CELLS_MAX:
+            return None
+        spare, mixed, _ = decompose(live, red, blue, self.width)
+        self.solved += 1
+        near: int = neighbor_counts(0, mixed, *_shifts(self.width))[1]
+        key = normalize(self.width, mixed, red & near, blue & near)
+        return mover_wins(*key, self.width, env.player, spare)
+
+    def winner(self, env) -> Player:
+        """Return the winner of the position of env, None if it is unknown"""
+        won: Optional[bool] = self.probe(env)
+        if won is None:
+            return None
+        return env.player if won else 3 - env.player
+
+    def best_move(self, env) -> Action:
+        """Return a winning move of the position of env if it has one, any
+        move if it is lost, None if the position cannot be analysed"""
+        if self.probe(env) is None:
+            return None
+        leg: list[Action] = env.legals()
+        for action in leg:
+            env.play(action)
+            won: Optional[bool] = self.probe(env)
+            env.undo(action)
+            if won is False:
+                return action
+        return leg[0] if leg else None
+
+    def stats(self) -> str:
+        """Probes and positions solved, with the sizes of the caches"""
+        return (
+            f"{self.solved}/{self.probes} solved, "
+            f"{spare_moves.cache_info().currsize} regions, "
+            f"{mover_wins.cache_info().currsize} games"
+        )
@@ -0,0 +1,190 @@
+"""Transposition table shared by several processes, without locks"""
+
+import weakref
+from multiprocessing import shared_memory
+from typing import Optional
+
+from client.gndclient import Action, Score
+from tools.hexagons import Hex
+from tools.transposition import TT_SIZE_LOG2, TTEntry
+from tools.zobrist import zobrist_keys
+
+# fields of the 64 bits data word of an entry, from the low bits
+MOVE_BITS = 18
+SCORE_BITS = 20
+AGE_BITS = 16
+FLAG_BITS = 2
+DEPTH_BITS = 8
+
+NO_MOVE = (1 << MOVE_BITS) - 1
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+SCORE_SHIFT = MOVE_BITS
+AGE_SHIFT = SCORE_SHIFT + SCORE_BITS
+FLAG_SHIFT = AGE_SHIFT + AGE_BITS
+DEPTH_SHIFT = FLAG_SHIFT + FLAG_BITS
+
+HEADER_WORDS = 2  # age of the current search, unused
+
+
+class ActionCodec:
+    """Number of each action of a board: the index of the cell for Gopher,
+    after them the pair of indexes of the cells for Dodo"""
+
+    def __init__(self, hex_size: int):
+        self.cells: list[Hex] = list(zobrist_keys(hex_size))
+        self.index: dict[Hex, int] = {cell: i for i, cell in enumerate(self.cells)}
+
+    def encode(self, action: Action) -> int:
+        """Return the number of the action, NO_MOVE for None"""
+        if action is None:
+            return NO_MOVE
+        if isinstance(action, Hex):
+            return self.index[action]
+        nb: int = len(self.cells)
+        return nb + self.index[action[0]] * nb + self.index[action[1]]
+
+    def decode(self, code: int) -> Action:
+        """Return the action of a number"""
+        if code == NO_MOVE:
+            return None
+        nb: int = len(self.cells)
+        if code < nb:
+            return self.cells[code]
+        start, end = divmod(code - nb, nb)
+        return self.cells[start], self.cells[end]
+
+
+class SharedTranspositionTable:
+    """Transposition table in shared memory, with the interface and the
+    replacement scheme of TranspositionTable
+
+    An entry is two 64 bits words: the key xored with the data, then the data
+    (depth, flag, age, score and move packed). A reader checks that the xor of
+    the two words gives its key, so an entry half written by another process
+    is seen as a miss, and no lock is needed. The process which creates the
+    table owns it: it starts the searches (age) and frees the memory; the
+    others attach to it by its name.
+    """
+
+    def __init__(
+        self,
+        hex_size: int,
+        size_log2: int = TT_SIZE_LOG2,
+        name: Optional[str] = None,
+    ):
+        self.hex_size: int = hex_size
+        self.size: int = 1 << size_log2
+        self._mask: int = self.size - 1
+        self.owner: bool = name is None
+        nbytes: int = 8 * (HEADER_WORDS + 2 * self.size)
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            # the processes of multiprocessing share the resource tracker of
+            # the owner, which frees the memory if the owner does not
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name: str = self._shm.name
+        self._words: memoryview = self._shm.buf.cast("Q")
+        self._codec: ActionCodec = ActionCodec(hex_size)
+        # frees the memory when the table is collected or at exit
+        self._finalizer = weakref.finalize(
+            self, _release, self._shm, self._words, self.owner
+        )
+
+        # counters of this process
+        self.probes: int = 0
+        self.hits: int = 0
+        self.collisions: int = 0
+        self.stores: int = 0
+        self.replacements: int = 0
+
+    @property
+    def age(self) -> int:
+        """Age of the current search"""
+        return self._words[0]
+
+    def new_search(self):
+        """Start a new search, older entries become replaceable (owner only:
+        the other processes help the search of the owner)"""
+        if self.owner:
+            self._words[0] = (self._words[0] + 1) & ((1 << AGE_BITS) - 1)
+
+    def _read(self, key: int) -> tuple[int, int]:
+        """Return the index of the slot of the key and its data, 0 for an empty
+        slot or a slot of another key"""
+        i: int = HEADER_WORDS + 2 * (key & self._mask)
+        data: int = self._words[i + 1]
+        if self._words[i] ^ data != key:
+            return i, 0
+        return i, data
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """Return the entry of the key, or None"""
+        self.probes += 1
+        i, data = self._read(key)
+        if not data:
+            if self._words[i + 1]:
+                self.collisions += 1
+            return None
+        self.hits += 1
+        return (
+            (data >> DEPTH_SHIFT) - 1,
+            (data >> FLAG_SHIFT) & ((1 << FLAG_BITS) - 1),
+            ((data >> SCORE_SHIFT) & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET,
+            self._codec.decode(data & NO_MOVE),
+        )
+
+    def store(self, key: int, depth: int, flag: int, score: Score, move: Action):
+        """Store the result of a search, if the replacement scheme allows it"""
+        i: int = HEADER_WORDS + 2 * (key & self._mask)
+        age: int = self._words[0]
+        old: int = self._words[i + 1]
+        if old:
+            old_age: int = (old >> AGE_SHIFT) & ((1 << AGE_BITS) - 1)
+            if old_age == age and (old >> DEPTH_SHIFT) - 1 > depth:
+                return  # keep the deeper entry of the current search
+            if self._words[i] ^ old != key:
+                self.replacements += 1
+        self.stores += 1
+        score = max(-SCORE_OFFSET, min(SCORE_OFFSET - 1, int(score)))
+        data: int = (
+            (depth + 1) << DEPTH_SHIFT
+            | flag << FLAG_SHIFT
+            | age << AGE_SHIFT
+            | (score + SCORE_OFFSET) << SCORE_SHIFT
+            | self._codec.encode(move)
+        )
+        self._words[i] = key ^ data
+        self._words[i + 1] = data
+
+    def clear(self):
+        """Empty the table and reset the counters of this process"""
+        self._words[HEADER_WORDS:] = memoryview(bytes(16 * self.size)).cast("Q")
+        self.probes = self.hits = self.collisions = self.stores = 0
+        self.replacements = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the counters of this process"""
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
+
+    def nbytes(self) -> int:
+        """Return the size of the shared memory"""
+        return self._shm.size
+
+    def close(self):
+        """Detach from the shared memory, and free it for the owner"""
+        self._finalizer()
+
+
+def _release(shm: shared_memory.SharedMemory, words: memoryview, owner: bool):
+    """Detach from a shared memory, and free it for the owner"""
+    words.release()
+    shm.close()
+    if owner:
+        shm.unlink()
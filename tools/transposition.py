@@ -0,0 +1,93 @@
+"""Transposition table for the alpha beta search"""
+
+from array import array
+from typing import Optional
+from client.gndclient import Action, Score
+
+# kind of score stored in an entry
+EXACT = 0
+LOWER = 1  # the search failed high, the score is a lower bound
+UPPER = 2  # the search failed low, the score is an upper bound
+
+# default number of entries, as a power of two
+TT_SIZE_LOG2 = 18
+
+TTEntry = tuple[int, int, Score, Action]  # depth, flag, score, best move
+
+
+class TranspositionTable:
+    """Fixed size transposition table indexed by Zobrist keys
+
+    One entry per slot, stored in preallocated arrays. An entry is replaced
+    by a search of the same or greater depth, or by any search once it comes
+    from an older move (age).
+    """
+
+    def __init__(self, size_log2: int = TT_SIZE_LOG2):
+        self.size: int = 1 << size_log2
+        self._mask: int = self.size - 1
+        self._keys: array = array("Q", bytes(8 * self.size))
+        self._depths: array = array("b", [-1]) * self.size  # -1 : empty slot
+        self._flags: array = array("B", bytes(self.size))
+        self._scores: array = array("d", bytes(8 * self.size))
+        self._ages: array = array("H", bytes(2 * self.size))
+        self._moves: list[Action] = [None] * self.size
+        self.age: int = 0
+
+        # counters
+        self.probes: int = 0
+        self.hits: int = 0
+        self.collisions: int = 0
+        self.stores: int = 0
+        self.replacements: int = 0
+
+    def new_search(self):
+        """Start a new search, older entries become replaceable"""
+        self.age = (self.age + 1) & 0xFFFF
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """Return the entry of the key, or None"""
+        self.probes += 1
+        i: int = key & self._mask
+        if self._depths[i] < 0:
+            return None
+        if self._keys[i] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return self._depths[i], self._flags[i], self._scores[i], self._moves[i]
+
+    def store(self, key: int, depth: int, flag: int, score: Score, move: Action):
+        """Store the result of a search, if the replacement scheme allows it"""
+        i: int = key & self._mask
+        if self._depths[i] >= 0:
+            if self._ages[i] == self.age and self._depths[i] > depth:
+                return  # keep the deeper entry of the current search
+            if self._keys[i] != key:
+                self.replacements += 1
+        self.stores += 1
+        self._keys[i] = key
+        self._depths[i] = depth
+        self._flags[i] = flag
+        self._scores[i] = score
+        self._ages[i] = self.age
+        self._moves[i] = move
+
+    def clear(self):
+        """Empty the table and reset the counters"""
+        self.__init__(self.size.bit_length() - 1)
+
+    def stats(self) -> dict[str, int]:
+        """Return the counters of the table"""
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
+
+    def nbytes(self) -> int:
+        """Return the memory used by the arrays of the table"""
+        arrays = (self._keys, self._depths, self._flags, self._scores, self._ages)
+        return sum(a.itemsize * len(a) for a in arrays) + 8 * len(self._moves)
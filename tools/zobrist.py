@@ -0,0 +1,71 @@
+"""Zobrist hashing of the game states"""
+
+import random
+from functools import lru_cache
+from client.gndclient import Player, RED, BLUE
+from tools.hexagons import Hex, board_symmetries
+
+# fixed seed: the keys are the same in every process and every run
+ZOBRIST_SEED = 0x1A02
+
+# xored in the key when BLUE is to play
+SIDE_KEY: int = random.Random(ZOBRIST_SEED).getrandbits(64)
+
+ZobristKeys = dict[Hex, tuple[int, int, int]]
+
+KEY_BITS = 64
+KEY_MASK = (1 << KEY_BITS) - 1
+
+IDENTITY = (0,)  # symmetries of a key which ignores them
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(hex_size: int) -> ZobristKeys:
+    """Return the 64 bits key of each (cell, player) of a board of size hex_size,
+    indexed by cell then by player (the EMPTY key is 0)"""
+    rng = random.Random(ZOBRIST_SEED + hex_size)
+    h: int = hex_size - 1
+    keys: ZobristKeys = {}
+    for r in range(h, -h - 1, -1):
+        for q in range(max(-h, r - h), min(h, r + h) + 1):
+            keys[Hex(q, r, -q - r)] = (0, rng.getrandbits(64), rng.getrandbits(64))
+    return keys
+
+
+@lru_cache(maxsize=None)
+def symmetric_keys(hex_size: int, symmetries: tuple[int, ...]) -> ZobristKeys:
+    """Return the keys of each (cell, player) in the images of the board by the
+    symmetries (indexes of board_symmetries), packed in one integer: the bits
+    64 j to 64 j + 63 are the key in the image by symmetries[j]. A move then
+    updates the keys of all the images with a single xor."""
+    keys: ZobristKeys = zobrist_keys(hex_size)
+    if symmetries == IDENTITY:
+        return keys
+    tables = board_symmetries(hex_size)
+    res: ZobristKeys = {}
+    for cell in keys:
+        packed: list[int] = [0, 0, 0]
+        for j, k in enumerate(symmetries):
+            image: tuple[int, int, int] = keys[tables[k][cell]]
+            for play in (RED, BLUE):
+                packed[play] |= image[play] << (KEY_BITS * j)
+        res[cell] = tuple(packed)
+    return res
+
+
+def symmetric_side_key(symmetries: tuple[int, ...]) -> int:
+    """Return SIDE_KEY in each image of symmetric_keys"""
+    return sum(SIDE_KEY << (KEY_BITS * j) for j in range(len(symmetries)))
+
+
+def zobrist_hash(
+    state: dict, player: Player, hex_size: int, symmetries: tuple[int, ...] = IDENTITY
+) -> int:
+    """Compute the key of a state from scratch, the packed keys of its images
+    by the symmetries if given"""
+    keys: ZobristKeys = symmetric_keys(hex_size, symmetries)
+    res: int = symmetric_side_key(symmetries) if player == BLUE else 0
+    for cell, play in state.items():
+        if play in (RED, BLUE):
+            res ^= keys[cell][play]
+    return res